@@ -3,19 +3,44 @@ FastAPI Embedding Service - Transformer Only
 Pure text-to-vector conversion service (NO vector database)
 Model: MiniLM-L6-v2 (384-dimensional embeddings)
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from starlette.requests import ClientDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from sentence_transformers import SentenceTransformer
+from typing import List, Literal, Optional, Union
+import asyncio
+import numpy as np
 import time
 from contextlib import asynccontextmanager
 
+from inference_executor import PRIORITY_BULK, InferenceExecutor, InferenceQueueFull
+from micro_batcher import MicroBatcher
+from batch_planner import PaddingStats, encode_bucketed
+from embedding_backends import load_backend
+from quantization import DEFAULT_MIN_COSINE, SAMPLE_CORPUS, load_quantized
+from embedding_cache import EmbeddingCache, EmbeddingKeys
+from embedding_store import EmbeddingStore, model_checksum
+from embedding_dtypes import Int8Calibration, convert
+from embedding_jobs import JobManager, JobNotFound
+from similarity import similarity_matrix, top_k_rows, top_k_similarity
+from catalog_delta import DeltaLog
+from catalog_index import CatalogIndex, load_catalog
+from embedding_manifest import checkpoint_version
+from index_format import is_packed_index
+from response_formats import (
+    BINARY_MEDIA_TYPES, EXPOSED_HEADERS, NDJSON, NPY, RequestBodyStreamingResponse,
+    base64_rows, binary_response, json_response, ndjson_line, negotiate
+)
+from text_sources import InvalidRecord, iter_lines, parse_ndjson_record
+
 # ============================================================================
 # Configuration
 # ============================================================================
 import os
 
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
 # Use system-wide model cache (installed once on server)
 # Falls back to local model for development
 MODEL_PATH = os.getenv(
@@ -27,10 +52,82 @@ MODEL_PATH = os.getenv(
 if not os.path.exists(MODEL_PATH):
     print(f"⚠️  Model not found at {MODEL_PATH}")
     print("   Using HuggingFace model (will download to cache)")
-    MODEL_PATH = "sentence-transformers/all-MiniLM-L6-v2"
+    MODEL_PATH = MODEL_NAME
+
+# Inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime CPU)
+BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH")  # Default: <model path>/onnx/model.onnx
+ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+
+# INT8 dynamic quantization: "none" or "int8" (refused if cosine agreement vs fp32 is too low)
+QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "none")
+QUANT_MIN_COSINE = float(os.getenv("EMBEDDING_QUANT_MIN_COSINE", str(DEFAULT_MIN_COSINE)))
+
+# Inference executor: model.encode runs on these threads, never on the event loop
+INFERENCE_THREADS = int(os.getenv("EMBEDDING_INFERENCE_THREADS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("EMBEDDING_INFERENCE_QUEUE_SIZE", "64"))
+
+# Dynamic batching: texts from concurrent requests share one forward pass
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+MAX_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_MAX_BATCH_WAIT_MS", "5"))
+
+# Length bucketing: each batch is split into forward passes of similar token length
+MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8192"))
+
+# int8 output calibration texts, one per line (default: built-in gift corpus)
+INT8_CALIBRATION_PATH = os.getenv("EMBEDDING_INT8_CALIBRATION_PATH")
+
+# In-process LRU embedding cache (0 disables)
+CACHE_MB = float(os.getenv("EMBEDDING_CACHE_MB", "64"))
+
+# Persistent on-disk embedding store, survives restarts and deploys (unset disables)
+STORE_DIR = os.getenv("EMBEDDING_STORE_DIR")
+
+# Similarity matrices: scores are computed in blocks of at most SIMILARITY_BLOCK_MB,
+# and a full (untruncated) matrix may not exceed SIMILARITY_MAX_MB
+SIMILARITY_BLOCK_MB = float(os.getenv("EMBEDDING_SIMILARITY_BLOCK_MB", "64"))
+SIMILARITY_MAX_MB = float(os.getenv("EMBEDDING_SIMILARITY_MAX_MB", "256"))
+
+# In-process catalog index for /api/v1/search (unset disables): a packed index from
+# build_index.py (memory-mapped), an embed_file.py / bulk job output directory, or a
+# JSONL/CSV/text file embedded at startup
+CATALOG_PATH = os.getenv("EMBEDDING_CATALOG_PATH")
+CATALOG_VERIFY = os.getenv("EMBEDDING_CATALOG_VERIFY", "false").lower() == "true"  # Hash packed index files at startup
+SEARCH_BATCH_SIZE = int(os.getenv("EMBEDDING_SEARCH_BATCH_SIZE", "32"))  # Queries per GEMM
+
+# Search index: "exact" (brute force), "ivf" (approximate, inverted file), "pq"
+# (approximate, product-quantized codes) or "binary" (Hamming scan over sign
+# bits + exact rerank); see build_index.py. A packed index brings its own type.
+SEARCH_INDEX = os.getenv("EMBEDDING_SEARCH_INDEX", "exact")
+IVF_LISTS = int(os.getenv("EMBEDDING_IVF_LISTS", "0"))  # 0 = about 4 * sqrt(catalog size)
+IVF_NPROBE = int(os.getenv("EMBEDDING_IVF_NPROBE", "0"))  # Lists scanned per query (0 = packed index's, else 8)
+PQ_SUBVECTORS = int(os.getenv("EMBEDDING_PQ_SUBVECTORS", "48"))  # Bytes per vector; must divide the dimension
+PQ_RERANK = int(os.getenv("EMBEDDING_PQ_RERANK", "100"))  # Candidates rescored with full vectors (0 = off)
+BINARY_RERANK = int(os.getenv("EMBEDDING_BINARY_RERANK", "200"))  # Candidates rescored with full vectors (0 = off)
+
+# Catalog updates (/api/v1/catalog/upsert and /delete; unset disables): an append-only
+# log shared by all workers and replayed at startup. Updates go to a delta segment,
+# compacted in the background once it holds CATALOG_MERGE_ROWS rows.
+CATALOG_DELTA_DIR = os.getenv("EMBEDDING_CATALOG_DELTA_DIR")
+CATALOG_MERGE_ROWS = int(os.getenv("EMBEDDING_CATALOG_MERGE_ROWS", "1000"))
 
-# Global variable for model
+# Bulk embedding jobs, checkpointed on disk and run at low priority (unset disables)
+JOBS_DIR = os.getenv("EMBEDDING_JOBS_DIR")
+JOB_CHUNK_SIZE = int(os.getenv("EMBEDDING_JOB_CHUNK_SIZE", "64"))  # Texts per bulk inference call
+
+# Global variables for model, inference executor, batching scheduler and caches
 model = None
+executor = None
+batcher = None
+embedding_keys = None
+cache = None
+store = None
+jobs = None
+catalog = None
+search_batcher = None
+padding_stats = PaddingStats()
+quantization_report = {"mode": "none", "enabled": False}
+int8_calibration = {}  # normalize flag -> Int8Calibration
 
 
 # ============================================================================
@@ -39,7 +136,8 @@ model = None
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load model on startup, cleanup on shutdown"""
-    global model
+    global model, executor, batcher, embedding_keys, cache, store, jobs, catalog, search_batcher
+    global quantization_report, int8_calibration
     
     print("="*80)
     print("🚀 STARTING EMBEDDING SERVICE API")
@@ -48,11 +146,143 @@ async def lifespan(app: FastAPI):
     # Load MiniLM model
     print(f"\n📦 Loading MiniLM model from: {MODEL_PATH}")
     start_time = time.time()
-    model = SentenceTransformer(MODEL_PATH)
+    model = load_backend(BACKEND, MODEL_PATH, ONNX_PATH, ONNX_THREADS)
     print(f"✓ Model loaded in {time.time() - start_time:.2f}s")
+    print(f"   Backend: {model.name}")
+    
+    if QUANTIZE != "none":
+        print(f"\n🔧 Enabling {QUANTIZE} quantization...")
+        model, quantization_report = load_quantized(model, QUANTIZE, QUANT_MIN_COSINE)
+        if quantization_report["enabled"]:
+            print(f"✓ {QUANTIZE} model enabled")
+        else:
+            print(f"⚠️  {QUANTIZE} model refused, serving fp32")
+        if "error" in quantization_report:
+            print(f"   Error: {quantization_report['error']}")
+        else:
+            print(f"   Min cosine vs fp32: {quantization_report['min_cosine']} "
+                  f"(threshold {QUANT_MIN_COSINE})")
     print(f"   Embedding dimension: 384D")
     print(f"   Max sequence length: 256 tokens")
     
+    # Calibrate per-dimension ranges for int8 output
+    calibration_texts = load_calibration_texts()
+    raw = np.concatenate([
+        model.encode(calibration_texts[i:i + MAX_BATCH_SIZE])
+        for i in range(0, len(calibration_texts), MAX_BATCH_SIZE)
+    ])
+    int8_calibration = {
+        False: Int8Calibration(raw),
+        True: Int8Calibration(l2_normalize(raw))
+    }
+    print(f"✓ int8 output calibrated on {len(calibration_texts)} texts")
+    
+    # Start inference workers
+    executor = InferenceExecutor(
+        num_workers=INFERENCE_THREADS,
+        max_queue_size=INFERENCE_QUEUE_SIZE
+    )
+    executor.start()
+    print("✓ Inference executor started")
+    print(f"   Threads: {INFERENCE_THREADS}, queue size: {INFERENCE_QUEUE_SIZE}")
+    
+    batcher = MicroBatcher(
+        run_batch=run_encode_batch,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_BATCH_WAIT_MS,
+        max_concurrent_batches=INFERENCE_THREADS
+    )
+    print("✓ Dynamic batching enabled")
+    print(f"   Max batch size: {MAX_BATCH_SIZE}, max wait: {MAX_BATCH_WAIT_MS}ms")
+    
+    embedding_keys = EmbeddingKeys(model_identity())
+    if CACHE_MB > 0:
+        cache = EmbeddingCache(
+            max_bytes=int(CACHE_MB * 1024 * 1024),
+            dimension=model.dimension
+        )
+        print("✓ Embedding cache enabled")
+        print(f"   Budget: {CACHE_MB:g}MB ({cache.capacity} vectors)")
+    
+    if STORE_DIR:
+        store = EmbeddingStore(
+            store_dir=STORE_DIR,
+            model_id=model_identity(),
+            checksum=model_checksum(model.weight_files()),
+            dimension=model.dimension
+        )
+        stats = store.stats()
+        print("✓ Persistent embedding store opened")
+        print(f"   Path: {store.path}{' (read-only)' if store.read_only else ''}")
+        print(f"   Entries: {stats['entries']}")
+    
+    if CATALOG_PATH:
+        print(f"\n📚 Loading catalog index from: {CATALOG_PATH}")
+        start_time = time.time()
+        max_block_bytes = int(SIMILARITY_BLOCK_MB * 1024 * 1024)
+        packed = is_packed_index(CATALOG_PATH)
+        if packed:
+            # Refuses (IndexMismatch) an index built with another model
+            catalog = CatalogIndex.open(
+                CATALOG_PATH,
+                model_version=checkpoint_version(MODEL_PATH),
+                verify=CATALOG_VERIFY,
+                max_block_bytes=max_block_bytes,
+                ann_options={"ivf": {"nprobe": IVF_NPROBE} if IVF_NPROBE else {}, "pq": {"rerank": PQ_RERANK},
+                             "binary": {"rerank": BINARY_RERANK}}
+            )
+        else:
+            catalog = load_catalog(
+                CATALOG_PATH,
+                encode=lambda texts: l2_normalize(encode_batch_sync(texts)),
+                max_block_bytes=max_block_bytes
+            )
+        search_batcher = MicroBatcher(
+            run_batch=run_search_batch,
+            max_batch_size=SEARCH_BATCH_SIZE,
+            max_wait_ms=MAX_BATCH_WAIT_MS
+        )
+        print(f"✓ Catalog index {'mapped' if packed else 'loaded'} in {time.time() - start_time:.2f}s")
+        print(f"   Items: {len(catalog)} ({catalog.vectors.nbytes / 1024 / 1024:.1f}MB)")
+        if packed:
+            print(f"   Index: {catalog.stats()['index']['type']}, model version: {catalog.model_version}")
+        elif SEARCH_INDEX == "ivf":
+            start_time = time.time()
+            catalog.enable_ivf(IVF_LISTS, IVF_NPROBE or 8)
+            print(f"✓ IVF index built in {time.time() - start_time:.2f}s")
+            print(f"   Lists: {catalog.ann.n_lists}, nprobe: {catalog.ann.nprobe}")
+        elif SEARCH_INDEX == "pq":
+            start_time = time.time()
+            catalog.enable_pq(PQ_SUBVECTORS, PQ_RERANK)
+            print(f"✓ PQ codes built in {time.time() - start_time:.2f}s")
+            print(f"   {PQ_SUBVECTORS} bytes/vector ({catalog.ann.codes.nbytes / 1024 / 1024:.1f}MB), "
+                  f"rerank: {PQ_RERANK}")
+        elif SEARCH_INDEX == "binary":
+            start_time = time.time()
+            catalog.enable_binary(BINARY_RERANK)
+            print(f"✓ Binary codes built in {time.time() - start_time:.2f}s")
+            print(f"   {catalog.ann.codes.nbytes / 1024 / 1024:.1f}MB, rerank: {BINARY_RERANK}")
+        if CATALOG_DELTA_DIR:
+            start_time = time.time()
+            log = DeltaLog(CATALOG_DELTA_DIR, catalog.dimension, catalog.stamp)
+            replayed = catalog.attach_log(log, CATALOG_MERGE_ROWS)
+            print(f"✓ Catalog delta log opened in {time.time() - start_time:.2f}s")
+            print(f"   Path: {CATALOG_DELTA_DIR}, replayed: {replayed} updates, live items: {len(catalog)}")
+            if log.archived:
+                print(f"   Base index changed: previous log archived to {log.archived}")
+    
+    if JOBS_DIR:
+        jobs = JobManager(
+            jobs_dir=JOBS_DIR,
+            encode=encode_bulk,
+            dimension=model.dimension,
+            chunk_size=JOB_CHUNK_SIZE
+        )
+        jobs.start()
+        print("✓ Bulk embedding jobs enabled")
+        print(f"   Path: {JOBS_DIR}{'' if jobs.runner else ' (jobs run in another worker)'}")
+        print(f"   Jobs: {jobs.stats()['jobs']}")
+    
     print("\n✅ Embedding Service Ready!")
     print("="*80)
     
@@ -60,6 +290,18 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     print("\n🛑 Shutting down...")
+    if jobs:
+        await jobs.stop()
+    jobs = None
+    search_batcher = None
+    catalog = None
+    if store:
+        store.close()
+    store = None
+    cache = None
+    batcher = None
+    executor.shutdown()
+    executor = None
     model = None
 
 
@@ -80,6 +322,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=EXPOSED_HEADERS,
 )
 
 
@@ -92,30 +335,118 @@ class EmbedRequest(BaseModel):
         ..., 
         min_items=1, 
         max_items=100,
-        description="List of text strings to embed (max 100 per request)"
+        description="List of text strings to embed (max 100 per request; use /api/v1/embed/stream for more)"
     )
     normalize: bool = Field(
         True, 
         description="Whether to normalize embeddings to unit length"
     )
+    encoding_format: Literal["float", "base64"] = Field(
+        "float",
+        description="float: list of numbers; base64: little-endian bytes of the output dtype, base64-encoded"
+    )
+    dtype: Literal["float32", "float16", "int8", "ubinary"] = Field(
+        "float32",
+        description=(
+            "Output precision: float32, float16, int8 (calibrated per dimension, see "
+            "/api/v1/model-info) or ubinary (sign bits packed 8 per byte)"
+        )
+    )
+    return_text: bool = Field(
+        True,
+        description="Echo the (truncated) input text with each embedding"
+    )
+    layout: Literal["objects", "matrix"] = Field(
+        "objects",
+        description="objects: one {text, embedding} per input; matrix: bare list of vectors in input order"
+    )
 
 
 class EmbeddingResult(BaseModel):
     """Single embedding result"""
-    text: str
-    embedding: List[float]
+    text: Optional[str] = Field(None, description="Omitted when return_text is false")
+    embedding: Union[List[int], List[float], str]
     tokens: Optional[int] = None
 
 
 class EmbedResponse(BaseModel):
     """Response model for embedding generation"""
-    embeddings: List[EmbeddingResult]
+    embeddings: Union[List[EmbeddingResult], List[Union[List[int], List[float], str]]]
     count: int
     dimension: int
-    model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    dtype: str = "float32"
+    model: str = MODEL_NAME
     processing_time_ms: float
 
 
+class SimilarityPair(BaseModel):
+    """One pair of texts to score"""
+    text_a: str
+    text_b: str
+
+
+class BatchSimilarityRequest(BaseModel):
+    """Request model for batched pair similarity"""
+    pairs: List[SimilarityPair] = Field(
+        ...,
+        min_items=1,
+        max_items=1000,
+        description="Pairs to score (max 1000 per request)"
+    )
+
+
+class SimilarityMatrixRequest(BaseModel):
+    """Request model for many-to-many similarity"""
+    texts_a: List[str] = Field(..., min_items=1, max_items=5000, description="Row texts (max 5000)")
+    texts_b: Optional[List[str]] = Field(
+        None,
+        max_items=5000,
+        description="Column texts (max 5000); omit to compare texts_a with itself"
+    )
+    top_k: Optional[int] = Field(
+        None,
+        ge=1,
+        le=1000,
+        description="Return only the k best columns per row (self-matches excluded when texts_b is omitted)"
+    )
+
+
+class RankRequest(BaseModel):
+    """Request model for ranking candidates against one query"""
+    query: str = Field(..., description="Text to rank against, e.g. a recipient description")
+    candidates: List[str] = Field(
+        ...,
+        min_items=1,
+        max_items=2000,
+        description="Candidate texts, e.g. gift descriptions (max 2000)"
+    )
+    top_k: Optional[int] = Field(None, ge=1, description="Return only the k best candidates (default: all)")
+    return_text: bool = Field(False, description="Echo the (truncated) candidate text with each result")
+
+
+class SearchRequest(BaseModel):
+    """Request model for catalog search"""
+    query: Optional[str] = Field(None, description="One query text")
+    queries: Optional[List[str]] = Field(None, min_items=1, max_items=100, description="Several query texts (max 100)")
+    top_k: int = Field(10, ge=1, le=1000, description="Results per query")
+
+
+class CatalogItem(BaseModel):
+    """One catalog item to add or replace"""
+    id: Union[str, int] = Field(..., description="Catalog id; an existing item with this id is replaced")
+    text: str = Field(..., min_length=1, description="Text to embed, e.g. the gift description")
+
+
+class CatalogUpsertRequest(BaseModel):
+    """Request model for catalog upserts"""
+    items: List[CatalogItem] = Field(..., min_items=1, max_items=1000, description="Items to add or replace (max 1000)")
+
+
+class CatalogDeleteRequest(BaseModel):
+    """Request model for catalog deletes"""
+    ids: List[Union[str, int]] = Field(..., min_items=1, max_items=1000, description="Catalog ids to delete (max 1000)")
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
@@ -125,6 +456,129 @@ class HealthResponse(BaseModel):
     max_sequence_length: int
 
 
+# ============================================================================
+# Inference Helpers
+# ============================================================================
+def model_identity() -> str:
+    """Identifies the vectors the loaded model produces (cache keys include it)"""
+    quantized = "int8" if quantization_report["enabled"] else "fp32"
+    return f"{MODEL_PATH}|{model.name}|{quantized}"
+
+
+def load_calibration_texts() -> List[str]:
+    """int8 calibration corpus: EMBEDDING_INT8_CALIBRATION_PATH lines, or the built-in sample"""
+    if not INT8_CALIBRATION_PATH:
+        return SAMPLE_CORPUS
+    with open(INT8_CALIBRATION_PATH, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    return texts[:10000] or SAMPLE_CORPUS
+
+
+def l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Row-wise L2 normalization (same epsilon as sentence-transformers)"""
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def encode_batch_sync(texts: List[str]) -> np.ndarray:
+    """Length-bucketed encode of one scheduler batch (runs on an inference thread)"""
+    return encode_bucketed(
+        texts,
+        token_lengths=model.token_lengths,
+        encode=model.encode,
+        max_batch_tokens=MAX_BATCH_TOKENS,
+        max_bucket_size=MAX_BATCH_SIZE,
+        stats=padding_stats
+    )
+
+
+async def run_encode_batch(texts: List[str]) -> np.ndarray:
+    """Encode one scheduler batch on the inference executor (unnormalized)"""
+    return await executor.submit(encode_batch_sync, texts)
+
+
+async def encode_with_model(texts: List[str], normalize: bool) -> np.ndarray:
+    """
+    Encode texts through the batching scheduler and await the float32 matrix.
+    Batches are encoded unnormalized so requests with either normalize flag
+    can share a forward pass; normalization is applied per request.
+    """
+    embeddings = await batcher.submit(texts)
+    if normalize:
+        embeddings = l2_normalize(embeddings)
+    return embeddings
+
+
+def search_batch_sync(queries: List[tuple]) -> List[list]:
+    """One GEMM for a batch of (query vector, k); each query gets its own top k (id, score)"""
+    vectors = np.stack([vector for vector, _ in queries])
+    results = catalog.search(vectors, max(k for _, k in queries))
+    return [results[i][:k] for i, (_, k) in enumerate(queries)]
+
+
+async def run_search_batch(queries: List[tuple]) -> List[tuple]:
+    """Search a scheduler batch of queries off the event loop (BLAS releases the GIL)"""
+    return await asyncio.to_thread(search_batch_sync, queries)
+
+
+async def encode_bulk(texts: List[str], normalize: bool) -> np.ndarray:
+    """
+    Encode a bulk job chunk at low priority: interactive batches queued at the
+    same time run first. Bypasses the batcher and caches.
+    """
+    while True:
+        try:
+            embeddings = await executor.submit(encode_batch_sync, texts, priority=PRIORITY_BULK)
+            break
+        except InferenceQueueFull:
+            await asyncio.sleep(0.05)
+    if normalize:
+        embeddings = l2_normalize(embeddings)
+    return embeddings
+
+
+async def encode_texts(texts: List[str], normalize: bool) -> np.ndarray:
+    """
+    Encode texts through the cache layers: in-process LRU, then the persistent
+    store, then the model for the remaining (deduplicated) misses.
+    """
+    if cache is None and store is None:
+        return await encode_with_model(texts, normalize)
+    
+    keys = embedding_keys.keys(texts, normalize)
+    embeddings = np.empty((len(texts), model.dimension), dtype=np.float32)
+    missing = cache.get_many(keys, embeddings) if cache else list(range(len(texts)))
+    
+    if missing and store:
+        missing_keys = [keys[i] for i in missing]
+        stored = np.empty((len(missing), model.dimension), dtype=np.float32)
+        still_missing = store.get_many(missing_keys, stored)
+        if len(still_missing) < len(missing):
+            found = np.ones(len(missing), dtype=bool)
+            found[still_missing] = False
+            found_positions = [i for i, hit in zip(missing, found) if hit]
+            embeddings[found_positions] = stored[found]
+            if cache:
+                cache.put_many([keys[i] for i in found_positions], stored[found])
+            missing = [missing[j] for j in still_missing]
+    
+    if missing:
+        unique_rows = {}  # key -> row in the model batch
+        unique_texts = []
+        for i in missing:
+            if keys[i] not in unique_rows:
+                unique_rows[keys[i]] = len(unique_texts)
+                unique_texts.append(texts[i])
+        vectors = await encode_with_model(unique_texts, normalize)
+        unique_keys = list(unique_rows)
+        if cache:
+            cache.put_many(unique_keys, vectors)
+        if store:
+            store.put_many_async(unique_keys, vectors)
+        embeddings[missing] = vectors[[unique_rows[keys[i]] for i in missing]]
+    return embeddings
+
+
 # ============================================================================
 # API Endpoints
 # ============================================================================
@@ -139,7 +593,16 @@ async def root():
         "endpoints": {
             "health": "/health",
             "embed": "/api/v1/embed",
+            "embed_stream": "/api/v1/embed/stream",
+            "jobs": "/api/v1/jobs",
             "model_info": "/api/v1/model-info",
+            "metrics": "/api/v1/metrics",
+            "similarity_batch": "/api/v1/similarity/batch",
+            "similarity_matrix": "/api/v1/similarity/matrix",
+            "rank": "/api/v1/rank",
+            "search": "/api/v1/search",
+            "catalog_upsert": "/api/v1/catalog/upsert",
+            "catalog_delete": "/api/v1/catalog/delete",
             "docs": "/docs"
         }
     }
@@ -151,25 +614,33 @@ async def health_check():
     return HealthResponse(
         status="healthy" if model else "unhealthy",
         model_loaded=model is not None,
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_name=MODEL_NAME,
         embedding_dimension=384,
         max_sequence_length=256
     )
 
 
 @app.post("/api/v1/embed", response_model=EmbedResponse, tags=["Embeddings"])
-async def generate_embeddings(request: EmbedRequest):
+async def generate_embeddings(request: EmbedRequest, accept: Optional[str] = Header(None)):
     """
     Generate embeddings for a list of text strings
     
     **Input:**
     - texts: List of 1-100 text strings
     - normalize: Whether to L2-normalize embeddings (recommended: True)
+    - encoding_format: "float" (default) or "base64" (little-endian bytes)
+    - dtype: "float32" (default), "float16", "int8" or "ubinary" (packed sign bits)
+    - return_text: Echo input text per embedding (default True)
+    - layout: "objects" (default) or "matrix" (`embeddings: [[...], ...]` in input order)
     
     **Output:**
     - 384-dimensional vectors for each input text
     - Processing time in milliseconds
     
+    **Binary output:** send `Accept: application/octet-stream` (raw float32
+    matrix) or `Accept: application/x-npy` (.npy file). Rows follow the order
+    of `texts`; shape and dtype are in the X-Embedding-Shape and
+    X-Embedding-Dtype headers. JSON remains the default.
     """
     if not model:
         raise HTTPException(status_code=503, detail="Model not loaded")
@@ -181,37 +652,60 @@ async def generate_embeddings(request: EmbedRequest):
     if len(request.texts) > 100:
         raise HTTPException(
             status_code=400, 
-            detail="Maximum 100 texts per request. Use batch processing for larger sets."
+            detail="Maximum 100 texts per request. Use /api/v1/embed/stream for larger sets."
         )
     
     start_time = time.time()
     
     try:
         # Generate embeddings
-        embeddings = model.encode(
-            request.texts,
-            normalize_embeddings=request.normalize,
-            show_progress_bar=False,
-            convert_to_numpy=True
-        )
+        embeddings = await encode_texts(request.texts, request.normalize)
+        
+        output = convert(embeddings, request.dtype, int8_calibration[request.normalize])
+        
+        media_type = negotiate(accept)
+        if media_type in BINARY_MEDIA_TYPES:
+            processing_time = (time.time() - start_time) * 1000
+            return binary_response(
+                output,
+                media_type,
+                headers={"X-Processing-Time-Ms": f"{processing_time:.2f}"},
+                dtype_label=request.dtype
+            )
         
         # Build results
-        results = []
-        for text, embedding in zip(request.texts, embeddings):
-            results.append(EmbeddingResult(
-                text=text[:100] + "..." if len(text) > 100 else text,  # Truncate long text in response
-                embedding=embedding.tolist()
-            ))
+        if request.encoding_format == "base64":
+            vectors = base64_rows(output)
+        else:
+            vectors = np.ascontiguousarray(output)  # Serialized straight from numpy
+        
+        if request.layout == "matrix":
+            results = vectors
+        elif request.return_text:
+            results = [
+                {
+                    "text": text[:100] + "..." if len(text) > 100 else text,  # Truncate long text in response
+                    "embedding": vector,
+                    "tokens": None
+                }
+                for text, vector in zip(request.texts, vectors)
+            ]
+        else:
+            results = [{"embedding": vector, "tokens": None} for vector in vectors]
         
         processing_time = (time.time() - start_time) * 1000  # Convert to ms
         
-        return EmbedResponse(
-            embeddings=results,
-            count=len(results),
-            dimension=384,
-            processing_time_ms=round(processing_time, 2)
-        )
+        return json_response({
+            "embeddings": results,
+            "count": len(request.texts),
+            "dimension": 384,
+            "dtype": request.dtype,
+            "model": MODEL_NAME,
+            "processing_time_ms": round(processing_time, 2)
+        })
         
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -219,6 +713,162 @@ async def generate_embeddings(request: EmbedRequest):
         )
 
 
+@app.post("/api/v1/embed/stream", tags=["Embeddings"])
+async def stream_embeddings(
+    request: Request,
+    normalize: bool = True,
+    chunk_size: int = Query(64, ge=1, le=1024, description="Texts encoded per chunk"),
+    dtype: Literal["float32", "float16", "int8", "ubinary"] = "float32",
+    encoding_format: Literal["float", "base64"] = "float"
+):
+    """
+    Bulk embedding over NDJSON, without the 100-text cap
+    
+    **Input (request body, one record per line):**
+    - a JSON string: `"scented candle"`
+    - or an object: `{"id": "sku-123", "text": "scented candle"}`
+    
+    **Output (application/x-ndjson, one line per input record, in order):**
+    - `{"index": 0, "id": "sku-123", "embedding": [...]}`
+    - `{"index": 1, "error": "..."}` for records that could not be parsed
+    
+    Lines are parsed as the body arrives and encoded in chunks of
+    `chunk_size`; results stream back as each chunk finishes, so memory
+    stays constant whatever the input size.
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    async def encode_chunk(records) -> bytes:
+        """records: (index, id, text, error) in input order"""
+        texts = [text for _, _, text, error in records if error is None]
+        vectors = []
+        if texts:
+            while True:
+                try:
+                    embeddings = await encode_texts(texts, normalize)
+                    break
+                except InferenceQueueFull:
+                    # Bulk input waits for capacity instead of failing the stream
+                    await asyncio.sleep(0.05)
+            output = convert(embeddings, dtype, int8_calibration[normalize])
+            vectors = base64_rows(output) if encoding_format == "base64" else np.ascontiguousarray(output)
+        
+        lines = []
+        row = 0
+        for index, record_id, _, error in records:
+            if error is not None:
+                lines.append(ndjson_line({"index": index, "error": error}))
+                continue
+            record = {"index": index, "embedding": vectors[row]}
+            if record_id is not None:
+                record["id"] = record_id
+            lines.append(ndjson_line(record))
+            row += 1
+        return b"".join(lines)
+    
+    async def results():
+        index = 0
+        records = []
+        try:
+            async for line in iter_lines(request.stream()):
+                try:
+                    record_id, text = parse_ndjson_record(line)
+                    records.append((index, record_id, text, None))
+                except InvalidRecord as e:
+                    records.append((index, None, None, str(e)))
+                index += 1
+                if len(records) >= chunk_size:
+                    yield await encode_chunk(records)
+                    records = []
+            if records:
+                yield await encode_chunk(records)
+        except ClientDisconnect:
+            return
+        except InvalidRecord as e:
+            if records:
+                yield await encode_chunk(records)
+            yield ndjson_line({"index": index, "error": str(e)})
+        except Exception as e:
+            yield ndjson_line({"error": f"Embedding generation failed: {str(e)}"})
+    
+    return RequestBodyStreamingResponse(results(), media_type=NDJSON)
+
+
+def job_view(job: dict) -> dict:
+    """Public job state, with download links once completed"""
+    view = {k: v for k, v in job.items() if k != "checkpoint"}
+    if job["status"] == "completed":
+        view["downloads"] = {
+            "embeddings": f"/api/v1/jobs/{job['id']}/embeddings.npy",
+            "ids": f"/api/v1/jobs/{job['id']}/ids.jsonl",
+            "errors": f"/api/v1/jobs/{job['id']}/errors.jsonl"
+        }
+    return view
+
+
+def get_job_or_404(job_id: str) -> dict:
+    if not jobs:
+        raise HTTPException(status_code=503, detail="Bulk jobs disabled (EMBEDDING_JOBS_DIR not set)")
+    try:
+        return jobs.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+
+@app.post("/api/v1/jobs", status_code=202, tags=["Jobs"])
+async def create_job(
+    request: Request,
+    format: Optional[Literal["jsonl", "csv", "txt"]] = Query(
+        None, description="Input format (default: from Content-Type, else jsonl)"
+    ),
+    normalize: bool = True
+):
+    """
+    Submit a bulk embedding job
+    
+    **Input (request body, the file itself):**
+    - jsonl: one JSON string or `{"id": ..., "text": ...}` per line
+    - csv: header row with a `text` column and an optional `id` column
+    - txt: one text per line
+    
+    The job runs in the background at lower priority than interactive
+    requests. Poll `GET /api/v1/jobs/{id}`; once completed, download
+    `embeddings.npy` (float32, one row per valid record) and `ids.jsonl`
+    (the id of each row, or its input record index when no id was given).
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not jobs:
+        raise HTTPException(status_code=503, detail="Bulk jobs disabled (EMBEDDING_JOBS_DIR not set)")
+    
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        format = {"text/csv": "csv", "text/plain": "txt"}.get(content_type, "jsonl")
+    
+    try:
+        job = await jobs.create(request.stream(), format, normalize)
+    except ClientDisconnect:
+        raise HTTPException(status_code=400, detail="Upload interrupted")
+    return job_view(job)
+
+
+@app.get("/api/v1/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str):
+    """Job status and progress (total, done, throughput, ETA)"""
+    return job_view(get_job_or_404(job_id))
+
+
+@app.get("/api/v1/jobs/{job_id}/{filename}", tags=["Jobs"])
+async def download_job_file(job_id: str, filename: Literal["embeddings.npy", "ids.jsonl", "errors.jsonl"]):
+    """Download a completed job's embeddings matrix, id manifest or rejected records"""
+    job = get_job_or_404(job_id)
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    media_type = NPY if filename.endswith(".npy") else NDJSON
+    return FileResponse(jobs.file_path(job_id, filename), media_type=media_type, filename=f"{job_id}-{filename}")
+
+
 @app.get("/api/v1/model-info", tags=["Info"])
 async def get_model_info():
     """Get detailed model information"""
@@ -226,8 +876,15 @@ async def get_model_info():
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     return {
-        "model_name": "sentence-transformers/all-MiniLM-L6-v2",
+        "model_name": MODEL_NAME,
         "model_type": "Sentence Transformer",
+        "backend": model.name,
+        "quantization": quantization_report,
+        "output_dtypes": ["float32", "float16", "int8", "ubinary"],
+        "int8_calibration": {
+            "normalized": int8_calibration[True].to_dict(),
+            "unnormalized": int8_calibration[False].to_dict()
+        },
         "base_model": "nreimers/MiniLM-L6-H384-uncased",
         "embedding_dimension": 384,
         "max_sequence_length": 256,  # tokens
@@ -261,6 +918,24 @@ async def get_model_info():
     }
 
 
+@app.get("/api/v1/metrics", tags=["Info"])
+async def get_metrics():
+    """Inference executor, batching scheduler and padding counters"""
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    return {
+        "executor": executor.stats(),
+        "batching": batcher.stats(),
+        "padding": padding_stats.stats(),
+        "cache": cache.stats() if cache else None,
+        "store": store.stats() if store else None,
+        "jobs": jobs.stats() if jobs else None,
+        "catalog": catalog.stats() if catalog else None,
+        "search_batching": search_batcher.stats() if search_batcher else None
+    }
+
+
 @app.post("/api/v1/similarity", tags=["Utilities"])
 async def compute_similarity(text1: str, text2: str):
     """
@@ -271,7 +946,7 @@ async def compute_similarity(text1: str, text2: str):
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     try:
-        embeddings = model.encode([text1, text2], normalize_embeddings=True)
+        embeddings = await encode_texts([text1, text2], normalize=True)
         
         # Cosine similarity (dot product when normalized)
         similarity = float(embeddings[0] @ embeddings[1])
@@ -287,10 +962,267 @@ async def compute_similarity(text1: str, text2: str):
                 "Not very similar"
             )
         }
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Similarity computation failed: {str(e)}")
+
+
+@app.post("/api/v1/similarity/batch", tags=["Utilities"])
+async def compute_similarity_batch(request: BatchSimilarityRequest):
+    """
+    Cosine similarity for many (text_a, text_b) pairs in one call
+    
+    Every distinct text is encoded once, in one batch, and all pairs are
+    scored together. `scores[i]` belongs to `pairs[i]`.
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    start_time = time.time()
+    
+    try:
+        # Each distinct text is encoded once, however many pairs use it
+        rows = {}
+        for pair in request.pairs:
+            rows.setdefault(pair.text_a, len(rows))
+            rows.setdefault(pair.text_b, len(rows))
+        embeddings = await encode_texts(list(rows), normalize=True)
+        
+        a = embeddings[[rows[pair.text_a] for pair in request.pairs]]
+        b = embeddings[[rows[pair.text_b] for pair in request.pairs]]
+        scores = np.einsum("ij,ij->i", a, b)  # Row-wise dot product = cosine (normalized)
+        
+        processing_time = (time.time() - start_time) * 1000
+        return json_response({
+            "scores": np.round(scores, 4),
+            "count": len(request.pairs),
+            "unique_texts": len(rows),
+            "processing_time_ms": round(processing_time, 2)
+        })
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Similarity computation failed: {str(e)}")
+
+
+@app.post("/api/v1/similarity/matrix", tags=["Utilities"])
+async def compute_similarity_matrix(request: SimilarityMatrixRequest, accept: Optional[str] = Header(None)):
+    """
+    Cosine similarity of every text in texts_a with every text in texts_b
+    
+    **Output:**
+    - default: `matrix[i][j]` = cosine(texts_a[i], texts_b[j])
+    - with top_k: `indices[i]` (positions in texts_b, best first) and `scores[i]`
+    
+    **Binary output** (full matrix only): `Accept: application/octet-stream` or
+    `application/x-npy` returns the float32 matrix, shape in X-Embedding-Shape.
+    
+    Scores are computed in row blocks of bounded size; a full matrix larger
+    than the server's ceiling is refused (use top_k).
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    self_similarity = request.texts_b is None
+    texts_b = request.texts_a if self_similarity else request.texts_b
+    media_type = negotiate(accept)
+    if request.top_k is not None and media_type in BINARY_MEDIA_TYPES:
+        raise HTTPException(status_code=406, detail="Binary output is available for the full matrix only")
+    
+    matrix_bytes = len(request.texts_a) * len(texts_b) * 4
+    if request.top_k is None and matrix_bytes > SIMILARITY_MAX_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A {len(request.texts_a)} x {len(texts_b)} matrix exceeds {SIMILARITY_MAX_MB:g}MB; use top_k"
+        )
+    
+    start_time = time.time()
+    
+    try:
+        rows = {}
+        for text in request.texts_a + ([] if self_similarity else texts_b):
+            rows.setdefault(text, len(rows))
+        embeddings = await encode_texts(list(rows), normalize=True)
+        a = embeddings[[rows[text] for text in request.texts_a]]
+        b = a if self_similarity else embeddings[[rows[text] for text in texts_b]]
+        
+        max_block_bytes = int(SIMILARITY_BLOCK_MB * 1024 * 1024)
+        if request.top_k is None:
+            # BLAS releases the GIL; keep the event loop free while it runs
+            scores = await asyncio.to_thread(similarity_matrix, a, b, max_block_bytes)
+            processing_time = (time.time() - start_time) * 1000
+            if media_type in BINARY_MEDIA_TYPES:
+                return binary_response(
+                    scores,
+                    media_type,
+                    headers={"X-Processing-Time-Ms": f"{processing_time:.2f}"}
+                )
+            return json_response({
+                "matrix": scores,
+                "shape": list(scores.shape),
+                "processing_time_ms": round(processing_time, 2)
+            })
+        
+        indices, scores = await asyncio.to_thread(
+            top_k_similarity, a, b, request.top_k, max_block_bytes, self_similarity
+        )
+        processing_time = (time.time() - start_time) * 1000
+        return json_response({
+            "indices": indices,
+            "scores": np.round(scores, 4),
+            "shape": [len(request.texts_a), len(texts_b)],
+            "top_k": indices.shape[1],
+            "processing_time_ms": round(processing_time, 2)
+        })
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Similarity computation failed: {str(e)}")
 
 
+@app.post("/api/v1/rank", tags=["Utilities"])
+async def rank_candidates(request: RankRequest):
+    """
+    Rank candidates by cosine similarity to a query, best first
+    
+    Query and candidates are encoded in one batch; only the scores travel
+    back. `index` is the candidate's position in the request.
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    start_time = time.time()
+    
+    try:
+        rows = {request.query: 0}
+        for text in request.candidates:
+            rows.setdefault(text, len(rows))
+        embeddings = await encode_texts(list(rows), normalize=True)
+        
+        candidates = embeddings[[rows[text] for text in request.candidates]]
+        scores = candidates @ embeddings[0]
+        indices, top_scores = top_k_rows(scores[None, :], request.top_k or len(scores))
+        
+        results = [
+            {"index": index, "score": round(score, 4)}
+            for index, score in zip(indices[0].tolist(), top_scores[0].tolist())
+        ]
+        if request.return_text:
+            for result in results:
+                text = request.candidates[result["index"]]
+                result["text"] = text[:100] + "..." if len(text) > 100 else text
+        
+        processing_time = (time.time() - start_time) * 1000
+        return {
+            "results": results,
+            "count": len(results),
+            "candidates": len(request.candidates),
+            "processing_time_ms": round(processing_time, 2)
+        }
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ranking failed: {str(e)}")
+
+
+@app.post("/api/v1/search", tags=["Search"])
+async def search_catalog(request: SearchRequest):
+    """
+    Top-k catalog items for a query (or several), by cosine similarity
+    
+    **Output:**
+    - `query`: `results` is a list of `{id, score}`, best first
+    - `queries`: `results[i]` is that list for `queries[i]`
+    
+    Searches are exact unless the service runs an IVF, PQ or binary index
+    (EMBEDDING_SEARCH_INDEX=ivf|pq|binary). Queries arriving together are searched as
+    one batch.
+    """
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not catalog:
+        raise HTTPException(status_code=503, detail="Catalog index disabled (EMBEDDING_CATALOG_PATH not set)")
+    if (request.query is None) == (request.queries is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of query or queries")
+    
+    start_time = time.time()
+    texts = [request.query] if request.query is not None else request.queries
+    
+    try:
+        embeddings = await encode_texts(texts, normalize=True)
+        matches = await search_batcher.submit([(vector, request.top_k) for vector in embeddings])
+        results = [
+            [{"id": item_id, "score": round(score, 4)} for item_id, score in found]
+            for found in matches
+        ]
+        
+        processing_time = (time.time() - start_time) * 1000
+        return {
+            "results": results[0] if request.query is not None else results,
+            "catalog_size": len(catalog),
+            "processing_time_ms": round(processing_time, 2)
+        }
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+
+def require_catalog_updates():
+    if not model:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not catalog:
+        raise HTTPException(status_code=503, detail="Catalog index disabled (EMBEDDING_CATALOG_PATH not set)")
+    if catalog.log is None:
+        raise HTTPException(status_code=503, detail="Catalog updates disabled (EMBEDDING_CATALOG_DELTA_DIR not set)")
+
+
+@app.post("/api/v1/catalog/upsert", tags=["Search"])
+async def upsert_catalog(request: CatalogUpsertRequest):
+    """
+    Add catalog items, or replace those whose id already exists
+    
+    Items are embedded and appended to the delta log; every worker searches
+    them from its next request. The last occurrence of a repeated id wins.
+    """
+    require_catalog_updates()
+    start_time = time.time()
+    try:
+        embeddings = await encode_texts([item.text for item in request.items], normalize=True)
+        await asyncio.to_thread(catalog.upsert, [item.id for item in request.items], embeddings)
+        
+        processing_time = (time.time() - start_time) * 1000
+        return {
+            "upserted": len(request.items),
+            "catalog_size": len(catalog),
+            "processing_time_ms": round(processing_time, 2)
+        }
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upsert failed: {str(e)}")
+
+
+@app.post("/api/v1/catalog/delete", tags=["Search"])
+async def delete_catalog(request: CatalogDeleteRequest):
+    """
+    Delete catalog items by id
+    
+    **Output:** `deleted` count and the `not_found` ids
+    """
+    require_catalog_updates()
+    try:
+        not_found = await asyncio.to_thread(catalog.delete, request.ids)
+        return {
+            "deleted": len(set(request.ids)) - len(not_found),
+            "not_found": not_found,
+            "catalog_size": len(catalog)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+
+
 # ============================================================================
 # Run Instructions
 # ============================================================================
@@ -0,0 +1,126 @@
+"""
+Length-Aware Batch Planner
+Groups texts of similar token length into separate forward passes so
+short gift titles are not padded out to the longest description.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Fixed cost of one forward pass, expressed in equivalent tokens.
+# Stops the planner from splitting a batch into many tiny passes.
+BUCKET_OVERHEAD_TOKENS = 64
+
+
+def plan_length_buckets(
+    token_lengths: Sequence[int],
+    max_batch_tokens: int = 8192,
+    max_bucket_size: int = 64,
+    overhead_tokens: int = BUCKET_OVERHEAD_TOKENS,
+) -> List[np.ndarray]:
+    """
+    Partition texts into buckets that minimize padded tokens.
+
+    Texts are sorted by length and split into contiguous runs, chosen by
+    dynamic programming to minimize sum(bucket_size * longest_in_bucket)
+    plus a per-bucket overhead. A bucket holds at most max_bucket_size
+    texts and max_batch_tokens padded tokens (a single longer text still
+    gets its own bucket).
+
+    Returns arrays of indices into token_lengths, one per bucket.
+    """
+    lengths = np.asarray(token_lengths, dtype=np.int64)
+    n = len(lengths)
+    if n == 0:
+        return []
+
+    order = np.argsort(-lengths, kind="stable")
+    sorted_lengths = lengths[order]
+
+    # best[i]: minimal cost of bucketing the i longest texts
+    best = np.zeros(n + 1, dtype=np.float64)
+    cut = np.zeros(n + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        # Candidate bucket starts j: the bucket is sorted[j:i], padded to sorted[j]
+        start = max(0, i - max_bucket_size)
+        j = np.arange(start, i)
+        sizes = i - j
+        padded = sizes * sorted_lengths[start:i]
+        cost = best[start:i] + padded + overhead_tokens
+        cost[(padded > max_batch_tokens) & (sizes > 1)] = np.inf
+        k = int(np.argmin(cost))
+        best[i] = cost[k]
+        cut[i] = start + k
+
+    buckets = []
+    i = n
+    while i > 0:
+        j = cut[i]
+        buckets.append(order[j:i])
+        i = j
+    buckets.reverse()
+    return buckets
+
+
+class PaddingStats:
+    """Thread-safe counters of real vs padded tokens"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = 0
+        self._forward_passes = 0
+        self._real_tokens = 0
+        self._padded_tokens = 0
+        self._unbucketed_padded_tokens = 0
+
+    def record(self, token_lengths: np.ndarray, buckets: List[np.ndarray]):
+        padded = sum(len(bucket) * int(token_lengths[bucket].max()) for bucket in buckets)
+        with self._lock:
+            self._texts += len(token_lengths)
+            self._forward_passes += len(buckets)
+            self._real_tokens += int(token_lengths.sum())
+            self._padded_tokens += padded
+            self._unbucketed_padded_tokens += len(token_lengths) * int(token_lengths.max())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "texts": self._texts,
+                "forward_passes": self._forward_passes,
+                "real_tokens": self._real_tokens,
+                "padded_tokens": self._padded_tokens,
+                "padding_efficiency": (
+                    round(self._real_tokens / self._padded_tokens, 4) if self._padded_tokens else 1.0
+                ),
+                "unbucketed_padding_efficiency": (
+                    round(self._real_tokens / self._unbucketed_padded_tokens, 4)
+                    if self._unbucketed_padded_tokens else 1.0
+                ),
+            }
+
+
+def encode_bucketed(
+    texts: List[str],
+    token_lengths: Callable[[List[str]], np.ndarray],
+    encode: Callable[[List[str]], np.ndarray],
+    max_batch_tokens: int = 8192,
+    max_bucket_size: int = 64,
+    stats: Optional[PaddingStats] = None,
+) -> np.ndarray:
+    """
+    Tokenize, plan length buckets, run one forward pass per bucket and
+    return the embeddings in the original order of texts.
+    """
+    lengths = np.asarray(token_lengths(texts), dtype=np.int64)
+    buckets = plan_length_buckets(lengths, max_batch_tokens, max_bucket_size)
+    if stats is not None:
+        stats.record(lengths, buckets)
+
+    output = None
+    for bucket in buckets:
+        embeddings = encode([texts[i] for i in bucket])
+        if output is None:
+            output = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+        output[bucket] = embeddings
+    return output
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: /api/v1/embed response serialization
+Compares the pydantic path (EmbeddingResult per text, response_model
+revalidation, jsonable encoding) with the orjson fast path, and the
+compact matrix layout, at 1, 10 and 100 texts. No model is needed;
+vectors are random 384-D float32.
+
+Usage: python3 benchmark_serialization.py [--repeat 200]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from app_embedding_service import MODEL_NAME, EmbeddingResult, EmbedResponse
+from response_formats import fast_json_response
+
+BATCH_SIZES = (1, 10, 100)
+
+
+def pydantic_path(texts, matrix):
+    """What the endpoint did before: per-item models, then FastAPI's response_model handling"""
+    results = [EmbeddingResult(text=text, embedding=row.tolist()) for text, row in zip(texts, matrix)]
+    response = EmbedResponse(
+        embeddings=results,
+        count=len(results),
+        dimension=384,
+        processing_time_ms=0.0
+    )
+    # FastAPI revalidates the returned object against response_model, then encodes it
+    validated = EmbedResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(texts, matrix):
+    """orjson straight from the numpy rows"""
+    return fast_json_response({
+        "embeddings": [
+            {"text": text, "embedding": row, "tokens": None}
+            for text, row in zip(texts, matrix)
+        ],
+        "count": len(texts),
+        "dimension": 384,
+        "dtype": "float32",
+        "model": MODEL_NAME,
+        "processing_time_ms": 0.0
+    }).body
+
+
+def matrix_path(texts, matrix):
+    """layout="matrix": one 2-D array, no echoed text"""
+    return fast_json_response({
+        "embeddings": matrix,
+        "count": len(texts),
+        "dimension": 384,
+        "dtype": "float32",
+        "model": MODEL_NAME,
+        "processing_time_ms": 0.0
+    }).body
+
+
+def best_of(fn, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed response serialization benchmark")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed runs per case")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("="*80)
+    print("Embed response serialization (ms, best / median)")
+    print("="*80)
+    print(f"{'texts':>6} {'pydantic':>20} {'orjson':>20} {'speedup':>9} {'matrix':>20} {'speedup':>9}")
+    for n in BATCH_SIZES:
+        texts = [f"Gift idea number {i} for a coffee lover" for i in range(n)]
+        matrix = rng.standard_normal((n, 384)).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        # Same wire schema, same float32 values
+        slow_doc = json.loads(pydantic_path(texts, matrix))
+        fast_doc = json.loads(fast_path(texts, matrix))
+        assert slow_doc.keys() == fast_doc.keys()
+        assert np.array_equal(
+            np.array([e["embedding"] for e in slow_doc["embeddings"]], dtype=np.float32),
+            np.array([e["embedding"] for e in fast_doc["embeddings"]], dtype=np.float32)
+        )
+
+        slow_best, slow_median = best_of(pydantic_path, args.repeat, texts, matrix)
+        fast_best, fast_median = best_of(fast_path, args.repeat, texts, matrix)
+        matrix_best, matrix_median = best_of(matrix_path, args.repeat, texts, matrix)
+        print(
+            f"{n:>6} {slow_best:>9.3f} / {slow_median:>8.3f} {fast_best:>9.3f} / {fast_median:>8.3f}"
+            f" {slow_median / fast_median:>8.1f}x"
+            f" {matrix_best:>9.3f} / {matrix_median:>8.3f} {slow_median / matrix_median:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Binary Index
+Two-stage search: a Hamming-distance scan over sign bits, then an exact
+cosine rerank of the best candidates.
+
+Stage one keeps one bit per dimension (the sign, packed like the ubinary
+output dtype) in uint64 words: 48 bytes for 384-D, 1/32 of float32. A scan
+is XOR + popcount per word. Stage two rescores the `rerank` nearest codes
+against the full float vectors, which are only read at those rows, so
+they can be a memmap that stays on disk.
+
+Codes are derived from the vectors in one pass; save / load only matter
+for packed indexes (index_format.py), which map them instead.
+"""
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from embedding_dtypes import convert
+from similarity import block_rows, top_k_rows
+
+
+def pack_codes(vectors: np.ndarray) -> np.ndarray:
+    """(rows, words) uint64 sign bits, zero-padded to whole words"""
+    packed = convert(vectors, "ubinary")
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class BinaryIndex:
+    """Sign-bit codes with Hamming top-k and exact rerank; returns catalog row numbers"""
+
+    def __init__(self, codes: np.ndarray, dimension: int, rerank: int = 200,
+                 vectors: Optional[np.ndarray] = None, max_block_bytes: int = 64 << 20):
+        self.codes = codes          # (words, rows) uint64, word-major so each scan step is contiguous
+        self.dimension = dimension
+        self.rerank = rerank        # Candidates rescored with full vectors (0 = Hamming estimates only)
+        self.vectors = vectors      # Full normalized vectors for reranking (may be a memmap)
+        self.max_block_bytes = max_block_bytes
+
+    def __len__(self) -> int:
+        return self.codes.shape[1]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, **kwargs) -> "BinaryIndex":
+        codes = np.empty((-(-vectors.shape[1] // 64), len(vectors)), dtype=np.uint64)
+        step = 1 << 16
+        for start in range(0, len(vectors), step):
+            codes[:, start:start + step] = pack_codes(np.asarray(vectors[start:start + step])).T
+        # The encoded vectors are also the rerank source
+        return cls(codes, vectors.shape[1], vectors=vectors, **kwargs)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"rows": len(self), "dimension": self.dimension}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False, **kwargs) -> "BinaryIndex":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r" if mmap else None)
+        return cls(codes, meta["dimension"], **kwargs)
+
+    def hamming(self, query_codes: np.ndarray, start: int, end: int) -> np.ndarray:
+        """(queries, end - start) differing bits between query codes and stored rows start:end"""
+        distances = np.zeros((len(query_codes), end - start), dtype=np.uint16)
+        for word in range(len(self.codes)):
+            distances += np.bitwise_count(query_codes[:, word, None] ^ self.codes[word, None, start:end])
+        return distances
+
+    def search(self, queries: np.ndarray, k: int, rerank: Optional[int] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalog rows and scores of the (approximate) k nearest rows per query.
+        With reranking, the max(k, rerank) nearest codes are rescored exactly
+        and the scores returned are exact; otherwise a score is the cosine
+        estimated from the Hamming distance, cos(pi * bits / dimension).
+        exclude: boolean mask of catalog rows that score -inf.
+        """
+        rerank = self.rerank if rerank is None else rerank
+        if self.vectors is None:
+            rerank = 0
+        keep = min(max(k, rerank), len(self))
+        query_codes = pack_codes(queries)
+
+        # Scan codes block by block, carrying each query's `keep` nearest rows
+        best = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        step = block_rows(2 * len(queries), self.max_block_bytes)  # uint64 XOR temporaries are (queries, rows)
+        for start in range(0, len(self), step):
+            end = min(start + step, len(self))
+            rows = np.broadcast_to(np.arange(start, end), (len(queries), end - start))
+            candidates = np.concatenate([best, rows], axis=1)
+            block = -self.hamming(query_codes, start, end).astype(np.float32)
+            if exclude is not None:
+                block[:, exclude[start:end]] = -np.inf
+            scores = np.concatenate([best_scores, block], axis=1)
+            order, best_scores = top_k_rows(scores, keep)
+            best = np.take_along_axis(candidates, order, axis=1)
+
+        if rerank:
+            exact = np.einsum("qrd,qd->qr", self.vectors[best.ravel()].reshape(*best.shape, -1), queries)
+            if exclude is not None:
+                exact[exclude[best]] = -np.inf
+            order, best_scores = top_k_rows(exact, k)
+            return np.take_along_axis(best, order, axis=1), best_scores
+        bits = -best_scores[:, :k]
+        estimates = np.where(np.isinf(bits), -np.inf, np.cos(np.pi * bits / self.dimension))
+        return best[:, :k], estimates.astype(np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "type": "binary",
+            "bytes_per_vector": len(self.codes) * 8,
+            "code_bytes": self.codes.nbytes,
+            "rerank": self.rerank if self.vectors is not None else 0,
+        }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Pack a catalog directory into a memory-mapped search index, optionally
+with an approximate (ANN) structure, and report its recall@k and latency
+against exact search.
+
+The catalog directory is an embed_file.py (or bulk job) output. The packed
+index (index_format.py) is written to <catalog>/index unless --output is
+given; point EMBEDDING_CATALOG_PATH at it. It is stamped with the model
+version from the catalog's meta.json, and the service refuses it if its
+model differs. Queries for the report are a random sample of catalog
+vectors.
+
+Usage: python3 build_index.py /var/lib/gift-intelligence/catalog [--index pq] [--lists 4096] [--k 10]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from binary_index import BinaryIndex
+from catalog_index import CatalogIndex
+from ivf_index import IvfIndex, default_lists
+from pq_index import PqIndex
+from similarity import top_k_similarity
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64)
+RERANKS = (0, 20, 50, 100, 200, 500)
+
+
+def recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    variants: Dict[Any, Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]],
+    batch_size: int = 32
+) -> List[Dict[str, Any]]:
+    """recall@k against exact search, and latency, for each search variant"""
+    def timed(search) -> Tuple[np.ndarray, float]:
+        start_time = time.perf_counter()
+        results = [search(queries[i:i + batch_size])[0] for i in range(0, len(queries), batch_size)]
+        return np.concatenate(results), (time.perf_counter() - start_time) * 1000 / len(queries)
+
+    exact, exact_ms = timed(lambda batch: top_k_similarity(batch, vectors, k, 64 << 20))
+    report = [{"variant": "exact", "recall": 1.0, "ms_per_query": round(exact_ms, 3)}]
+    for name, search in variants.items():
+        found, ms = timed(search)
+        hits = sum(len(np.intersect1d(a[a >= 0], b)) for a, b in zip(found, exact))
+        report.append({"variant": name, "recall": round(hits / exact.size, 4), "ms_per_query": round(ms, 3)})
+    return report
+
+
+def build_ann(catalog: CatalogIndex, args):
+    """ANN structure for --index, or None for exact search"""
+    if args.index == "ivf":
+        n_lists = args.lists or default_lists(len(catalog))
+        print(f"\nTraining {n_lists} centroids...")
+        return IvfIndex.build(catalog.vectors, n_lists, args.nprobe, args.iterations)
+    if args.index == "pq":
+        print(f"\nTraining {args.subvectors} codebooks...")
+        return PqIndex.build(catalog.vectors, args.subvectors, args.iterations)
+    if args.index == "binary":
+        print("\nComputing sign-bit codes...")
+        return BinaryIndex.build(catalog.vectors)
+    return None
+
+
+def report_variants(catalog: CatalogIndex, k: int):
+    """Print the ANN structure; returns its search variants and a tuning hint"""
+    ann = catalog.ann
+    if isinstance(ann, IvfIndex):
+        stats = ann.stats()
+        print(f"   Lists: {stats['n_lists']}, mean size: {stats['mean_list_size']}, max size: {stats['max_list_size']}")
+        variants = {
+            f"nprobe={nprobe}": (lambda batch, nprobe=nprobe: ann.search(batch, k, nprobe))
+            for nprobe in NPROBES if nprobe <= ann.n_lists
+        }
+        return variants, ("Rebuild with --nprobe (or set EMBEDDING_IVF_NPROBE) to the smallest nprobe "
+                          "with acceptable recall.")
+    if isinstance(ann, (PqIndex, BinaryIndex)):
+        print(f"   Codes: {ann.stats()['bytes_per_vector']} bytes/vector, {ann.codes.nbytes / 1024 / 1024:.1f}MB "
+              f"(float32: {catalog.vectors.nbytes / 1024 / 1024:.1f}MB)")
+        variants = {
+            f"rerank={rerank}": (lambda batch, rerank=rerank: ann.search(batch, k, rerank))
+            for rerank in RERANKS if rerank <= len(ann)
+        }
+        setting = "EMBEDDING_PQ_RERANK" if isinstance(ann, PqIndex) else "EMBEDDING_BINARY_RERANK"
+        return variants, f"Set {setting} to the smallest rerank with acceptable recall."
+    return {}, "Exact search: nothing to tune."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a catalog into a mapped index and report recall vs latency")
+    parser.add_argument("catalog", help="Directory with embeddings.npy and ids.jsonl")
+    parser.add_argument("--index", choices=["exact", "ivf", "pq", "binary"], default="ivf", help="Index type")
+    parser.add_argument("--output", help="Packed index directory (default: <catalog>/index)")
+    parser.add_argument("--model-version", help="Model version stamp (default: model_version in <catalog>/meta.json)")
+    parser.add_argument("--lists", type=int, default=0, help="IVF coarse centroids (default: about 4 * sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF lists scanned per query, stored with the index")
+    parser.add_argument("--subvectors", type=int, default=48, help="PQ slices per vector (= bytes per vector)")
+    parser.add_argument("--iterations", type=int, default=20, help="k-means iterations")
+    parser.add_argument("--k", type=int, default=10, help="k for recall@k")
+    parser.add_argument("--queries", type=int, default=1000, help="Sampled queries for the report")
+    parser.add_argument("--report-only", action="store_true", help="Open the packed index instead of building")
+    args = parser.parse_args()
+    output = args.output or os.path.join(args.catalog, "index")
+
+    print("=" * 80)
+    print("🔧 CATALOG INDEX BUILD")
+    print("=" * 80)
+    if not args.report_only:
+        version = args.model_version
+        meta_path = os.path.join(args.catalog, "meta.json")
+        if version is None and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                version = json.load(f).get("model_version")
+        if version is None:
+            sys.exit(f"❌ No model_version in {meta_path}: pass --model-version")
+
+        catalog = CatalogIndex.from_directory(args.catalog)
+        print(f"✓ Catalog: {len(catalog)} vectors, {catalog.dimension}D")
+        start_time = time.time()
+        catalog.ann = build_ann(catalog, args)
+        catalog.save(output, int(version, 16))
+        print(f"✓ {args.index} index built in {time.time() - start_time:.1f}s")
+        print(f"   Packed to {output} (model version {version})")
+
+    # Report on the packed files, mapped as the service maps them
+    catalog = CatalogIndex.open(output, model_version=None, verify=True)
+    print(f"✓ Opened {output}: {len(catalog)} vectors, checksums OK")
+    variants, hint = report_variants(catalog, args.k)
+
+    rng = np.random.default_rng(0)
+    queries = np.asarray(catalog.vectors[rng.choice(len(catalog), min(args.queries, len(catalog)), replace=False)])
+    print(f"\nrecall@{args.k} vs exact search ({len(queries)} queries, batches of 32):")
+    print(f"   {'variant':>12}  {'recall':>8}  {'ms/query':>9}")
+    for row in recall_report(catalog.vectors, queries, args.k, variants):
+        print(f"   {row['variant']:>12}  {row['recall']:>8.4f}  {row['ms_per_query']:>9.3f}")
+    print(f"\n{hint}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
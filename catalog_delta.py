@@ -0,0 +1,177 @@
+"""
+Catalog Delta Log
+Append-only, on-disk log of catalog upserts and deletes, shared by every
+uvicorn worker.
+
+Layout:
+    <delta_dir>/meta.json     stamp of the base index the log applies to
+    <delta_dir>/vectors.f32   raw float32 rows of upserted items
+    <delta_dir>/log.jsonl     {"id": ..., "row": n} (upsert) or {"id": ..., "deleted": true}
+
+Any worker may append (appends are serialized with flock): vector rows
+first, then the log lines that point at them, so a crash never leaves a
+line without its vector. A torn tail left by a crashed writer, in either
+file, is trimmed by the next append. Each worker reads the whole lines
+appended since its last read and applies them to its in-memory segments,
+so all workers converge on the same catalog, and a restart replays the log.
+
+The log belongs to one base index: when the base is rebuilt (its stamp
+changes), the old log is archived and a new one started, since the
+rebuilt base already reflects the catalog feed. Workers starting together
+check and archive under a lock file next to the delta directory
+(<delta_dir>.lock), so only the first one archives.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# (id, normalized vector) for an upsert, (id, None) for a delete
+Mutation = Tuple[Any, Optional[np.ndarray]]
+
+
+def trim_torn_line(path: str):
+    """Truncate a text file after its last newline (drops a partially written last line)"""
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+class DeltaLog:
+    """Shared append-only mutation log for one base catalog index"""
+
+    def __init__(self, path: str, dimension: int, base_stamp: str):
+        self.path = path
+        self.dimension = dimension
+        self._row_bytes = dimension * 4
+        self.archived: Optional[str] = None
+
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._log_path = os.path.join(path, "log.jsonl")
+        self._lock_path = os.path.join(path, "writer.lock")
+
+        # Outside the directory, which may be renamed away while held
+        with open(f"{path.rstrip('/')}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._open(base_stamp)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self._lock = threading.Lock()
+        self._offset = 0     # Bytes of log.jsonl already read
+        self._appended = 0   # Mutations appended by this process
+        self._read = 0       # Mutations read (from any process)
+        self._skipped = 0    # Undecodable lines skipped
+
+    def _open(self, base_stamp: str):
+        """Archive a log left for another base, then create any missing files; caller holds the lock"""
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("base") != base_stamp or meta.get("dimension") != self.dimension:
+                archived = f"{self.path.rstrip('/')}.{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+                suffix = 1
+                while os.path.exists(archived if suffix == 1 else f"{archived}.{suffix}"):
+                    suffix += 1
+                self.archived = archived if suffix == 1 else f"{archived}.{suffix}"
+                os.rename(self.path, self.archived)
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(meta_path):
+            tmp_path = f"{meta_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "base": base_stamp,
+                    "dimension": self.dimension,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                }, f, indent=2)
+            os.replace(tmp_path, meta_path)
+        for name in (self._vectors_path, self._log_path):
+            open(name, "ab").close()
+
+    def append(self, mutations: List[Mutation]):
+        """Durably append mutations; they take effect when read back with read_new"""
+        vectors = [vector for _, vector in mutations if vector is not None]
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # A torn tail from a crashed writer is overwritten
+                row = os.path.getsize(self._vectors_path) // self._row_bytes
+                with open(self._vectors_path, "r+b") as f:
+                    f.seek(row * self._row_bytes)
+                    if vectors:
+                        f.write(np.asarray(vectors, dtype=np.float32).tobytes())
+                    f.truncate()
+                trim_torn_line(self._log_path)
+                lines = []
+                for row_id, vector in mutations:
+                    if vector is None:
+                        lines.append(json.dumps({"id": row_id, "deleted": True}))
+                    else:
+                        lines.append(json.dumps({"id": row_id, "row": row}))
+                        row += 1
+                with open(self._log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in lines))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        with self._lock:
+            self._appended += len(mutations)
+
+    def has_new(self) -> bool:
+        """Cheap check (one stat) for lines appended since the last read"""
+        return os.path.getsize(self._log_path) > self._offset
+
+    def read_new(self) -> List[Mutation]:
+        """Mutations appended (by any worker) since the last call, in log order"""
+        with self._lock:
+            size = os.path.getsize(self._log_path)
+            if size <= self._offset:
+                return []
+            with open(self._log_path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+            # Only whole lines: a writer may be mid-append
+            data = data[:data.rfind(b"\n") + 1]
+            self._offset += len(data)
+            entries = []
+            for line in filter(None, data.splitlines()):
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Written glued to a torn line before the tail was trimmed
+                    self._skipped += 1
+            self._read += len(entries)
+
+        rows = [entry["row"] for entry in entries if "row" in entry]
+        vectors = np.empty((0, self.dimension), dtype=np.float32)
+        if rows:
+            mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r")
+            vectors = np.array(mapped.reshape(-1, self.dimension)[rows])
+            del mapped
+        found = iter(vectors)
+        return [(entry["id"], None if entry.get("deleted") else next(found)) for entry in entries]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "mutations": self._read,
+                "appended_here": self._appended,
+                "skipped_lines": self._skipped,
+                "bytes": os.path.getsize(self._vectors_path) + os.path.getsize(self._log_path),
+            }
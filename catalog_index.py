@@ -0,0 +1,395 @@
+"""
+Catalog Index
+In-process vector index over the gift catalog for top-k search.
+
+All vectors live in one contiguous, L2-normalized float32 matrix; a search
+is one matmul against it plus argpartition per query (exact, brute force).
+The service batches concurrent queries into a single GEMM. For large
+catalogs an IVF index (ivf_index.py), product-quantized codes
+(pq_index.py) or sign-bit codes (binary_index.py) can answer instead,
+approximately.
+
+Sources:
+- a packed index written by save() / build_index.py (index_format.py),
+  memory-mapped rather than loaded
+- a directory written by embed_file.py or a bulk job (embeddings.npy + ids.jsonl)
+- a JSONL/CSV/text file of records, embedded at load time
+
+Updates: with a delta log attached (catalog_delta.py), upserts append to an
+in-memory delta segment and deletes set tombstones; the base rows are never
+rewritten. A search covers the base (minus tombstones) and the segments. A
+background merge compacts the delta into a merged segment once it reaches
+merge_rows, dropping dead rows; build_index.py folds everything into a new
+base offline.
+"""
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from binary_index import BinaryIndex
+from catalog_delta import DeltaLog
+from index_format import IdColumn, read_header, replace_directory, write_header, write_ids
+from ivf_index import IvfIndex
+from pq_index import PqIndex
+from similarity import top_k_rows, top_k_similarity
+from text_sources import format_for_path, iter_file_records
+
+
+def file_stamp(path: str) -> str:
+    """Identifies one version of a catalog source file (path, size, mtime)"""
+    stat = os.stat(path)
+    return hashlib.sha256(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+
+
+class Segment:
+    """Append-only (id, vector) rows with a tombstone per row"""
+
+    def __init__(self, dimension: int, capacity: int = 256):
+        self.ids: List[Any] = []
+        self.vectors = np.empty((capacity, dimension), dtype=np.float32)
+        self.dead = np.zeros(capacity, dtype=bool)
+        self.dead_count = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, row_id: Any, vector: np.ndarray) -> int:
+        row = len(self.ids)
+        if row == len(self.vectors):
+            # Readers keep the old arrays; they only read rows below their len()
+            vectors = np.empty((2 * row, self.vectors.shape[1]), dtype=np.float32)
+            vectors[:row] = self.vectors
+            dead = np.zeros(2 * row, dtype=bool)
+            dead[:row] = self.dead
+            self.vectors, self.dead = vectors, dead
+        self.vectors[row] = vector
+        self.ids.append(row_id)
+        return row
+
+
+class CatalogIndex:
+    """Top-k search over (id, vector) rows: a fixed base plus optional update segments"""
+
+    def __init__(self, ids: List[Any], vectors: np.ndarray, source: str = "", max_block_bytes: int = 64 << 20,
+                 normalized: bool = False):
+        if not normalized:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1)
+            # Rows never written (e.g. an interrupted embed_file.py run) are all zeros
+            keep = norms > 0
+            if not keep.all():
+                ids = [row_id for row_id, kept in zip(ids, keep) if kept]
+                vectors, norms = vectors[keep], norms[keep]
+            vectors = np.ascontiguousarray(vectors / norms[:, None], dtype=np.float32)
+        self.ids = ids
+        self.vectors = vectors  # A read-only memmap for packed indexes
+        self.dimension = self.vectors.shape[1]
+        self.source = source
+        self.max_block_bytes = max_block_bytes
+        self.ann: Optional[Union[IvfIndex, PqIndex, BinaryIndex]] = None
+        self.model_version: Optional[str] = None  # Stamp of a packed index
+        self.stamp = ""  # Identifies the base rows; a delta log applies to one stamp
+
+        # Updates (see attach_log); searches read these without locking
+        self.log: Optional[DeltaLog] = None
+        self.merge_rows = 1000
+        self._base_dead = np.zeros(len(ids), dtype=bool)
+        self._base_dead_count = 0
+        self._segments = (Segment(self.dimension), Segment(self.dimension))  # (merged, delta)
+        self._locations: Dict[Any, Tuple[Segment, int]] = {}  # id -> segment row, for ids updated since the base
+        self._base_rows: Optional[Dict[Any, int]] = None  # id -> base row when the ids are not an IdColumn
+        self._mutate_lock = threading.Lock()
+        self._merger: Optional[threading.Thread] = None
+        self._merges = 0
+
+        self._lock = threading.Lock()
+        self._searches = 0
+        self._queries = 0
+        self._search_seconds = 0.0
+
+    def __len__(self) -> int:
+        """Live items: base rows without tombstones plus live segment rows"""
+        segments = sum(len(segment) - segment.dead_count for segment in self._segments)
+        return len(self.ids) - self._base_dead_count + segments
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_directory(cls, path: str, **kwargs) -> "CatalogIndex":
+        """embeddings.npy + ids.jsonl, as written by embed_file.py or a bulk job"""
+        vectors = np.load(os.path.join(path, "embeddings.npy"))
+        with open(os.path.join(path, "ids.jsonl"), encoding="utf-8") as f:
+            ids = [json.loads(line) for line in f]
+        if len(ids) != len(vectors):
+            raise ValueError(f"{path}: {len(vectors)} vectors but {len(ids)} ids")
+        catalog = cls(ids, vectors, source=path, **kwargs)
+        catalog.stamp = file_stamp(os.path.join(path, "embeddings.npy"))
+        return catalog
+
+    @classmethod
+    def from_records(
+        cls,
+        path: str,
+        encode: Callable[[List[str]], np.ndarray],
+        chunk_size: int = 256,
+        **kwargs
+    ) -> "CatalogIndex":
+        """Embed a JSONL/CSV/text file; records without an id are keyed by position"""
+        ids, texts = [], []
+        for index, record_id, text, error in iter_file_records(path, format_for_path(path)):
+            if error is None:
+                ids.append(index if record_id is None else record_id)
+                texts.append(text)
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        if texts:
+            vectors = np.concatenate([encode(texts[i:i + chunk_size]) for i in range(0, len(texts), chunk_size)])
+        catalog = cls(ids, vectors, source=path, **kwargs)
+        catalog.stamp = file_stamp(path)
+        return catalog
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        model_version: Optional[int],
+        verify: bool = False,
+        max_block_bytes: int = 64 << 20,
+        ann_options: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> "CatalogIndex":
+        """
+        Map a packed index (see save). Raises index_format.IndexMismatch when
+        it is damaged or was built with another model version.
+        ann_options: per index type overrides, e.g. {"ivf": {"nprobe": 16}}
+        """
+        header = read_header(path, model_version, verify)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        catalog = cls(IdColumn(path), vectors, source=path, max_block_bytes=max_block_bytes, normalized=True)
+        catalog.model_version = header["model_version"]
+        catalog.stamp = header["checksum"]
+
+        ann_type = header["index"]["type"]
+        options = (ann_options or {}).get(ann_type, {})
+        ann_path = os.path.join(path, ann_type)
+        if ann_type == "ivf":
+            catalog.ann = IvfIndex.load(ann_path, mmap=True, **options)
+        elif ann_type in ("pq", "binary"):
+            ann_class = PqIndex if ann_type == "pq" else BinaryIndex
+            catalog.ann = ann_class.load(ann_path, mmap=True, vectors=vectors, max_block_bytes=max_block_bytes,
+                                         **options)
+        return catalog
+
+    def save(self, path: str, model_version: int):
+        """
+        Write this catalog, with its ANN structure if any, as a packed index
+        stamped with model_version; an existing index at path is replaced
+        once the new one is complete. Only a catalog without updates can be
+        saved: re-embed and rebuild to fold updates in.
+        """
+        if self._base_dead_count or any(len(segment) for segment in self._segments):
+            raise ValueError("Catalog has updates that a packed index cannot hold; rebuild from the catalog feed")
+        tmp_path = f"{path}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, "vectors.npy"), self.vectors)
+        write_ids(tmp_path, self.ids)
+        index = self.ann.stats() if self.ann is not None else {"type": "exact"}
+        if self.ann is not None:
+            self.ann.save(os.path.join(tmp_path, index["type"]))
+        write_header(tmp_path, model_version, len(self.ids), self.dimension, index, self.source)
+        replace_directory(tmp_path, path)
+
+    def enable_ivf(self, n_lists: int = 0, nprobe: int = 8):
+        """Answer searches with an IVF index built now (build_index.py packs one ahead of time)"""
+        self.ann = IvfIndex.build(self.vectors, n_lists or None, nprobe)
+
+    def enable_pq(self, subvectors: int = 48, rerank: int = 0):
+        """
+        Answer searches from product-quantized codes built now; rerank > 0
+        rescores that many candidates per query against the full vectors
+        """
+        self.ann = PqIndex.build(self.vectors, subvectors, rerank=rerank, max_block_bytes=self.max_block_bytes)
+
+    def enable_binary(self, rerank: int = 200):
+        """
+        Answer searches with a Hamming scan over sign bits, rescoring the
+        nearest `rerank` rows per query against the full vectors
+        """
+        self.ann = BinaryIndex.build(self.vectors, rerank=rerank, max_block_bytes=self.max_block_bytes)
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def attach_log(self, log: DeltaLog, merge_rows: int = 1000) -> int:
+        """Take updates from a delta log, replaying what it already holds; returns the replayed count"""
+        if not isinstance(self.ids, IdColumn):
+            # Packed indexes find ids in their mapped hash column; an in-memory base gets a map now,
+            # before any search, rather than under the update lock
+            self._base_rows = {row_id: row for row, row_id in enumerate(self.ids)}
+        self.log = log
+        self.merge_rows = merge_rows
+        return self.sync()
+
+    def upsert(self, ids: List[Any], vectors: np.ndarray):
+        """Add or replace items (normalized vectors); visible to every worker once logged"""
+        self.log.append(list(zip(ids, vectors)))
+        self.sync()
+
+    def delete(self, ids: List[Any]) -> List[Any]:
+        """Delete items by id; returns the ids that were not in the catalog"""
+        ids = list(dict.fromkeys(ids))
+        with self._mutate_lock:
+            self._apply(self.log.read_new())
+            found = [row_id for row_id in ids if self._find(row_id) is not None]
+            missing = [row_id for row_id in ids if self._find(row_id) is None]
+        if found:
+            self.log.append([(row_id, None) for row_id in found])
+            self.sync()
+        return missing
+
+    def sync(self) -> int:
+        """Apply log entries written since the last sync (by any worker); returns their count"""
+        if self.log is None or not self.log.has_new():
+            return 0
+        with self._mutate_lock:
+            mutations = self.log.read_new()
+            self._apply(mutations)
+        return len(mutations)
+
+    def _find(self, row_id: Any) -> Optional[Tuple[Optional[Segment], int]]:
+        """Live location of an id: (segment, row), (None, base row), or None. Caller holds _mutate_lock."""
+        location = self._locations.get(row_id)
+        if location is not None:
+            return location
+        row = self.ids.find(row_id) if self._base_rows is None else self._base_rows.get(row_id)
+        if row is None or self._base_dead[row]:
+            return None
+        return None, row
+
+    def _apply(self, mutations: List[Tuple[Any, Optional[np.ndarray]]]):
+        """Caller holds _mutate_lock"""
+        if not mutations:
+            return
+        for row_id, vector in mutations:
+            old = self._find(row_id)
+            if old is not None:
+                segment, row = old
+                if segment is None:
+                    self._base_dead[row] = True
+                    self._base_dead_count += 1
+                else:
+                    segment.dead[row] = True
+                    segment.dead_count += 1
+                    del self._locations[row_id]
+            if vector is not None:
+                delta = self._segments[1]
+                self._locations[row_id] = (delta, delta.append(row_id, vector))
+        if len(self._segments[1]) >= self.merge_rows and (self._merger is None or not self._merger.is_alive()):
+            self._merger = threading.Thread(target=self._merge, name="catalog-merge", daemon=True)
+            self._merger.start()
+
+    def _merge(self):
+        """Compact the merged and delta segments into one, without blocking searches or updates"""
+        with self._mutate_lock:
+            merged, delta = self._segments
+            merged_rows, delta_rows = len(merged), len(delta)
+            keep_merged, keep_delta = ~merged.dead[:merged_rows], ~delta.dead[:delta_rows]
+
+        # Rows below the snapshot never change, only their tombstones
+        ids = [row_id for row_id, kept in zip(merged.ids[:merged_rows], keep_merged) if kept]
+        ids += [row_id for row_id, kept in zip(delta.ids[:delta_rows], keep_delta) if kept]
+        compacted = Segment(self.dimension, max(256, len(ids)))
+        compacted.ids = ids
+        compacted.vectors[:len(ids)] = np.concatenate([
+            merged.vectors[:merged_rows][keep_merged], delta.vectors[:delta_rows][keep_delta]
+        ])
+
+        with self._mutate_lock:
+            # Tombstones set since the snapshot carry over
+            dead = np.concatenate([merged.dead[:merged_rows][keep_merged], delta.dead[:delta_rows][keep_delta]])
+            compacted.dead[:len(ids)] = dead
+            compacted.dead_count = int(dead.sum())
+            tail = Segment(self.dimension)
+            for row in range(delta_rows, len(delta)):
+                tail.append(delta.ids[row], delta.vectors[row])
+                if delta.dead[row]:
+                    tail.dead[row - delta_rows] = True
+                    tail.dead_count += 1
+
+            for segment in (compacted, tail):
+                for row, row_id in enumerate(segment.ids):
+                    if not segment.dead[row]:
+                        self._locations[row_id] = (segment, row)
+            self._segments = (compacted, tail)
+            self._merges += 1
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def search(self, queries: np.ndarray, k: int) -> List[List[Tuple[Any, float]]]:
+        """(id, score) of the k nearest items for each (normalized) query, best first"""
+        start_time = time.perf_counter()
+        self.sync()
+        exclude = self._base_dead if self._base_dead_count else None
+        if self.ann is not None:
+            indices, scores = self.ann.search(queries, k, exclude=exclude)
+        else:
+            indices, scores = top_k_similarity(queries, self.vectors, k, self.max_block_bytes, exclude=exclude)
+        results = [
+            [(self.ids[row], score) for row, score in zip(rows.tolist(), row_scores.tolist()) if score > -np.inf]
+            for rows, row_scores in zip(indices, scores)
+        ]
+
+        for segment in self._segments:
+            rows = len(segment)  # Read before the arrays: they always hold this many rows
+            vectors, dead, segment_ids = segment.vectors, segment.dead, segment.ids
+            if rows == 0:
+                continue
+            segment_scores = queries @ vectors[:rows].T
+            segment_scores[:, dead[:rows]] = -np.inf
+            top, top_scores = top_k_rows(segment_scores, k)
+            for found, (rows_i, scores_i) in zip(results, zip(top.tolist(), top_scores.tolist())):
+                found.extend((segment_ids[row], score) for row, score in zip(rows_i, scores_i) if score > -np.inf)
+        if any(len(segment) for segment in self._segments):
+            results = [heapq.nlargest(k, found, key=lambda item: item[1]) for found in results]
+
+        with self._lock:
+            self._searches += 1
+            self._queries += len(queries)
+            self._search_seconds += time.perf_counter() - start_time
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        merged, delta = self._segments
+        with self._lock:
+            return {
+                "source": self.source,
+                "size": len(self),
+                "base_rows": len(self.ids),
+                "base_deleted": self._base_dead_count,
+                "merged_rows": len(merged) - merged.dead_count,
+                "delta_rows": len(delta) - delta.dead_count,
+                "merges": self._merges,
+                "delta_log": self.log.stats() if self.log is not None else None,
+                "dimension": self.dimension,
+                "bytes": self.vectors.nbytes,
+                "searches": self._searches,
+                "queries": self._queries,
+                "mean_queries_per_search": round(self._queries / self._searches, 2) if self._searches else 0.0,
+                "search_seconds": round(self._search_seconds, 3),
+                "index": self.ann.stats() if self.ann is not None else {"type": "exact"},
+                "memory_mapped": isinstance(self.vectors, np.memmap),
+                "model_version": self.model_version,
+            }
+
+
+def load_catalog(path: str, encode: Callable[[List[str]], np.ndarray], **kwargs) -> CatalogIndex:
+    """Catalog from an embeddings directory, or from a file of texts to embed (packed indexes: see open)"""
+    if os.path.isdir(path):
+        return CatalogIndex.from_directory(path, **kwargs)
+    return CatalogIndex.from_records(path, encode, **kwargs)
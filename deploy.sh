@@ -16,6 +16,27 @@ SERVER_PATH="/var/www/gift-intelligence"
 # Files to deploy (EXCLUDE models)
 DEPLOY_FILES=(
     "app_embedding_service.py"
+    "inference_executor.py"
+    "micro_batcher.py"
+    "batch_planner.py"
+    "embedding_backends.py"
+    "quantization.py"
+    "embedding_cache.py"
+    "embedding_store.py"
+    "response_formats.py"
+    "embedding_dtypes.py"
+    "text_sources.py"
+    "embedding_jobs.py"
+    "similarity.py"
+    "catalog_index.py"
+    "ivf_index.py"
+    "pq_index.py"
+    "binary_index.py"
+    "index_format.py"
+    "catalog_delta.py"
+    "embed_file.py"
+    "embedding_manifest.py"
+    "build_index.py"
     "requirements.txt"
     "README.md"
     "embedding-service.service"
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Offline bulk embedding: embed a large input file without the HTTP service.
+
+A pool of worker processes each loads the model, pinned to its own share
+of the CPU cores, and writes its chunks straight into a memory-mapped
+embeddings.npy.
+
+Runs are incremental: the output directory keeps a manifest of (id, text
+hash, model version) per row, and only new ids, changed texts and rows from
+another model are embedded; the vector file is patched in place. Records
+should carry ids for this (records without one are keyed by input position).
+An interrupted run continues when the same command is run again.
+
+Output directory:
+    meta.json         model and summary of the last run
+    embeddings.npy    float32 (rows, dimension)
+    ids.jsonl         id of each row
+    manifest.npy      (text hash, model version) of each row, see embedding_manifest.py
+    texts.jsonl       texts embedded by the last run
+    errors.jsonl      input records that could not be used
+
+Usage: python3 embed_file.py gifts.jsonl /data/gift-embeddings [--workers 4] [--backend onnx]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from batch_planner import encode_bucketed
+from embedding_backends import BACKENDS, load_backend
+from embedding_manifest import apply_update, checkpoint_version, plan_update
+from text_sources import INPUT_FORMATS, format_for_path, iter_file_records
+
+DEFAULT_MODEL_PATH = "/opt/models/minilm"  # Installed by install_model_on_server.py
+
+_worker = {}  # Per-process model and output map, set up by _init_worker
+
+
+def usable_cores() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_groups(workers: int) -> list:
+    """Split the usable cores into one contiguous group per worker"""
+    cores = usable_cores()
+    workers = max(1, min(workers, len(cores)))
+    return [group.tolist() for group in np.array_split(np.array(cores), workers)]
+
+
+# ============================================================================
+# Worker processes
+# ============================================================================
+def _init_worker(core_groups, settings: dict):
+    cores = core_groups.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if settings["backend"] == "torch":
+        import torch
+        torch.set_num_threads(len(cores))
+    _worker["model"] = load_backend(settings["backend"], settings["model_path"], settings["onnx_path"], len(cores))
+    _worker["matrix"] = np.lib.format.open_memmap(os.path.join(settings["output"], "embeddings.npy"), mode="r+")
+    _worker["texts_path"] = os.path.join(settings["output"], "texts.jsonl")
+    _worker["settings"] = settings
+
+
+def _embed_chunk(task: tuple) -> np.ndarray:
+    """Encode one chunk of texts.jsonl into its rows of the output matrix"""
+    offset, rows = task
+    model = _worker["model"]
+    with open(_worker["texts_path"], "rb") as f:
+        f.seek(offset)
+        texts = [json.loads(f.readline()) for _ in range(len(rows))]
+    embeddings = encode_bucketed(
+        texts,
+        token_lengths=model.token_lengths,
+        encode=model.encode,
+        max_batch_tokens=_worker["settings"]["max_batch_tokens"],
+        max_bucket_size=_worker["settings"]["max_bucket_size"]
+    )
+    if _worker["settings"]["normalize"]:
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    matrix = _worker["matrix"]
+    matrix[rows] = embeddings
+    matrix.flush()
+    return rows
+
+
+# ============================================================================
+# Driver
+# ============================================================================
+def chunk_tasks(output: str, pending_rows: np.ndarray, chunk_size: int) -> list:
+    """(byte offset into texts.jsonl, target rows) per chunk of pending texts"""
+    tasks = []
+    offset = 0
+    with open(os.path.join(output, "texts.jsonl"), "rb") as f:
+        for start in range(0, len(pending_rows), chunk_size):
+            rows = pending_rows[start:start + chunk_size]
+            tasks.append((offset, rows))
+            for _ in range(len(rows)):
+                offset += len(f.readline())
+    return tasks
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed a JSONL/CSV/text file into a memory-mapped .npy")
+    parser.add_argument("input", help="Input file: JSONL, CSV (with a text column) or one text per line")
+    parser.add_argument("output", help="Output directory; an existing one is updated incrementally")
+    parser.add_argument("--format", choices=INPUT_FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument("--workers", type=int, default=max(1, len(usable_cores()) // 2),
+                        help="Worker processes, each pinned to its share of the cores (default: cores / 2)")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--model-path", default=os.getenv("EMBEDDING_MODEL_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--onnx-path", default=os.getenv("EMBEDDING_ONNX_PATH"))
+    parser.add_argument("--no-normalize", action="store_true", help="Keep raw (unnormalized) vectors")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="Texts per work item and checkpoint")
+    parser.add_argument("--max-batch-tokens", type=int, default=8192, help="Padded tokens per forward pass")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Texts per forward pass")
+    parser.add_argument("--restart", action="store_true", help="Discard existing embeddings and embed everything")
+    args = parser.parse_args()
+
+    settings = {
+        "format": args.format or format_for_path(args.input),
+        "model_path": args.model_path,
+        "backend": args.backend,
+        "normalize": not args.no_normalize,
+    }
+
+    print("=" * 80)
+    print("🚀 OFFLINE BULK EMBEDDING")
+    print("=" * 80)
+    os.makedirs(args.output, exist_ok=True)
+    if args.restart:
+        for name in ("embeddings.npy", "ids.jsonl", "manifest.npy"):
+            if os.path.exists(os.path.join(args.output, name)):
+                os.remove(os.path.join(args.output, name))
+
+    print(f"📦 Loading model: {args.model_path}")
+    model = load_backend(args.backend, args.model_path, args.onnx_path)
+    dimension = model.dimension
+    version = checkpoint_version(args.model_path, settings["normalize"])
+    del model
+
+    print(f"📄 Comparing {args.input} ({settings['format']}) with {args.output}...")
+    plan = plan_update(iter_file_records(args.input, settings["format"]), args.output, version)
+    apply_update(args.output, plan, dimension)
+    counts = plan.counts
+    with open(os.path.join(args.output, "meta.json"), "w") as f:
+        json.dump(dict(
+            settings,
+            input=os.path.abspath(args.input),
+            model_version=f"{version:016x}",
+            dimension=dimension,
+            rows=plan.rows,
+            last_run=counts,
+            updated=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        ), f, indent=2)
+    print(f"✓ {plan.rows} rows: {counts['unchanged']} unchanged, {counts['changed']} changed, "
+          f"{counts['added']} added, {counts['removed']} removed, {counts['invalid']} invalid (see errors.jsonl)")
+
+    total = len(plan.pending_rows)
+    if not total:
+        print("✅ Nothing to embed, embeddings are up to date")
+        return
+    tasks = chunk_tasks(args.output, plan.pending_rows, args.chunk_size)
+
+    groups = cpu_groups(args.workers)
+    print(f"\n⚙️  {len(groups)} workers, cores: {' | '.join(','.join(map(str, g)) for g in groups)}")
+    print(f"   {total} texts to embed in {len(tasks)} chunks of up to {args.chunk_size}\n")
+
+    context = multiprocessing.get_context("spawn")
+    core_queue = context.Queue()
+    for group in groups:
+        core_queue.put(group)
+    worker_settings = dict(
+        settings,
+        output=args.output,
+        onnx_path=args.onnx_path,
+        max_batch_tokens=args.max_batch_tokens,
+        max_bucket_size=args.max_batch_size
+    )
+
+    manifest = np.load(os.path.join(args.output, "manifest.npy"), mmap_mode="r+")
+    start_time = time.perf_counter()
+    completed = 0
+    with context.Pool(len(groups), initializer=_init_worker, initargs=(core_queue, worker_settings)) as pool:
+        for rows in pool.imap_unordered(_embed_chunk, tasks):
+            # The checkpoint: rows are marked current only after their vectors are flushed
+            manifest["version"][rows] = version
+            manifest.flush()
+            completed += len(rows)
+            rate = completed / (time.perf_counter() - start_time)  # Includes model loading
+            sys.stdout.write(
+                f"\r   {completed}/{total} texts ({completed / total:.1%})  "
+                f"{rate:,.0f} texts/s  ETA {format_duration((total - completed) / rate)}   "
+            )
+            sys.stdout.flush()
+    core_queue.close()
+    core_queue.join_thread()
+    del manifest
+
+    print(f"\n\n✅ Embeddings written to {os.path.join(args.output, 'embeddings.npy')}")
+    print(f"   Shape: ({plan.rows}, {dimension}), ids: {os.path.join(args.output, 'ids.jsonl')}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Inference Backends
+Interchangeable engines behind the service's `model` global:
+- torch: SentenceTransformer (eager PyTorch)
+- onnx:  ONNX Runtime CPU session over a graph exported once at install time
+
+Every backend returns the same 384-D mean-pooled float32 vectors.
+Callers apply L2 normalization themselves when it is requested.
+"""
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx")
+
+# ONNX graph location relative to the installed model directory
+ONNX_SUBDIR = "onnx"
+ONNX_FILENAME = "model.onnx"
+
+
+def default_onnx_path(model_path: str) -> str:
+    """Where install_model_on_server.py writes the exported graph"""
+    return os.path.join(model_path, ONNX_SUBDIR, ONNX_FILENAME)
+
+
+def checkpoint_files(model_path: str) -> List[str]:
+    """PyTorch weight files of an installed model: the source every backend is derived from"""
+    if not os.path.isdir(model_path):
+        return []
+    return [
+        os.path.join(model_path, name)
+        for name in sorted(os.listdir(model_path))
+        if name.endswith((".safetensors", ".bin"))
+    ]
+
+
+def _token_lengths(tokenizer, texts: List[str], max_seq_length: int) -> np.ndarray:
+    encoded = tokenizer(
+        texts,
+        add_special_tokens=True,
+        truncation=True,
+        max_length=max_seq_length,
+        return_attention_mask=False,
+        return_token_type_ids=False
+    )
+    return np.fromiter((len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts))
+
+
+# ============================================================================
+# PyTorch
+# ============================================================================
+class TorchBackend:
+    """Eager PyTorch inference through SentenceTransformer"""
+
+    name = "torch"
+
+    def __init__(self, model_path: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_path = model_path
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def weight_files(self) -> List[str]:
+        """Files whose content determines the output vectors"""
+        return checkpoint_files(self.model_path)
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Token count of each text as the model will see it (incl. special tokens)"""
+        return _token_lengths(self.tokenizer, texts, self.max_seq_length)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """One forward pass over texts; returns the float32 embedding matrix"""
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=False,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+
+# ============================================================================
+# ONNX Runtime
+# ============================================================================
+class OnnxBackend:
+    """
+    ONNX Runtime CPU inference.
+
+    The graph holds only the transformer (token embeddings out); tokenization,
+    mean pooling and the model's Normalize module (if present) run here, so
+    the output matches the SentenceTransformer pipeline.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, onnx_path: Optional[str] = None, num_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=onnx requires onnxruntime (pip install onnxruntime)"
+            )
+        from transformers import AutoTokenizer
+
+        if not os.path.isdir(model_path):
+            raise RuntimeError(
+                f"ONNX backend needs a local model directory, got {model_path}. "
+                "Run install_model_on_server.py first."
+            )
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.onnx_path = onnx_path or default_onnx_path(model_path)
+        if not os.path.exists(self.onnx_path):
+            raise RuntimeError(
+                f"ONNX graph not found at {self.onnx_path}. "
+                "Run install_model_on_server.py to export it."
+            )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_seq_length, self.dimension, self.normalize_output = _read_pipeline_config(model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            self.onnx_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def weight_files(self) -> List[str]:
+        """Files whose content determines the output vectors"""
+        return [self.onnx_path]
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Token count of each text as the model will see it (incl. special tokens)"""
+        return _token_lengths(self.tokenizer, texts, self.max_seq_length)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """One forward pass over texts; returns the float32 embedding matrix"""
+        features = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        feed = {
+            name: features[name].astype(np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in self._input_names
+        }
+        token_embeddings = self.session.run(None, feed)[0]
+
+        # Mean pooling over real (non-pad) tokens
+        mask = features["attention_mask"].astype(np.float32)[:, :, None]
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings = (summed / counts).astype(np.float32)
+
+        if self.normalize_output:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.maximum(norms, 1e-12)
+        return embeddings
+
+
+def _read_pipeline_config(model_path: str):
+    """max_seq_length, dimension and trailing-Normalize flag of a saved SentenceTransformer"""
+    with open(os.path.join(model_path, "sentence_bert_config.json")) as f:
+        max_seq_length = json.load(f)["max_seq_length"]
+    with open(os.path.join(model_path, "modules.json")) as f:
+        modules = json.load(f)
+
+    pooling = next(m for m in modules if m["type"].endswith("models.Pooling"))
+    with open(os.path.join(model_path, pooling["path"], "config.json")) as f:
+        pooling_config = json.load(f)
+    if not pooling_config.get("pooling_mode_mean_tokens"):
+        raise RuntimeError("ONNX backend only supports mean pooling models")
+
+    normalize = any(m["type"].endswith("models.Normalize") for m in modules)
+    return max_seq_length, pooling_config["word_embedding_dimension"], normalize
+
+
+# ============================================================================
+# Export (used by install_model_on_server.py)
+# ============================================================================
+def export_onnx(model_path: str, onnx_path: Optional[str] = None, opset: int = 17) -> str:
+    """Export the transformer of a saved SentenceTransformer to ONNX"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    onnx_path = onnx_path or default_onnx_path(model_path)
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+
+    st_model = SentenceTransformer(model_path, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    sample = st_model.tokenizer(
+        ["export sample", "a slightly longer export sample sentence"],
+        padding=True,
+        return_tensors="pt"
+    )
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False
+        )
+    return onnx_path
+
+
+def validate_onnx(model_path: str, onnx_path: Optional[str] = None, texts: Optional[List[str]] = None) -> float:
+    """Minimum cosine similarity between torch and ONNX embeddings on sample texts"""
+    texts = texts or [
+        "Personalized leather wallet for dad",
+        "Scented soy candle gift set",
+        "Birthday present ideas for a coffee lover who enjoys hiking on weekends",
+        "Mug",
+    ]
+    reference = TorchBackend(model_path).encode(texts)
+    candidate = OnnxBackend(model_path, onnx_path).encode(texts)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate /= np.linalg.norm(candidate, axis=1, keepdims=True)
+    return float(np.min(np.sum(reference * candidate, axis=1)))
+
+
+def load_backend(kind: str, model_path: str, onnx_path: Optional[str] = None, num_threads: int = 0):
+    """Instantiate the backend selected by EMBEDDING_BACKEND"""
+    if kind == "torch":
+        return TorchBackend(model_path)
+    if kind == "onnx":
+        return OnnxBackend(model_path, onnx_path, num_threads)
+    raise ValueError(f"Unknown embedding backend '{kind}' (expected one of: {', '.join(BACKENDS)})")
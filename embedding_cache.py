@@ -0,0 +1,119 @@
+"""
+In-Process Embedding Cache
+Bounded LRU cache of embeddings in front of the model. Vectors live in one
+preallocated float32 slab; the LRU index maps a 16-byte key to a slab row.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Approximate bookkeeping cost per entry (dict node, key bytes, slot int),
+# counted against the memory budget alongside the vector itself
+ENTRY_OVERHEAD_BYTES = 160
+
+
+class EmbeddingKeys:
+    """
+    16-byte blake2b digests of (model identity, normalize flag, text).
+    Shared by every embedding cache layer, so a different model or flag
+    never returns a stale vector.
+    """
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        prefix = hashlib.blake2b(digest_size=16)
+        prefix.update(model_id.encode("utf-8"))
+        self._prefixes = {}
+        for normalize in (False, True):
+            hasher = prefix.copy()
+            hasher.update(b"\x01" if normalize else b"\x00")
+            self._prefixes[normalize] = hasher
+
+    def keys(self, texts: List[str], normalize: bool) -> List[bytes]:
+        """Keys for texts under the given normalize flag"""
+        prefix = self._prefixes[bool(normalize)]
+        keys = []
+        for text in texts:
+            hasher = prefix.copy()
+            hasher.update(text.encode("utf-8"))
+            keys.append(hasher.digest())
+        return keys
+
+
+class EmbeddingCache:
+    """LRU embedding cache with a fixed memory budget, keyed by EmbeddingKeys digests"""
+
+    def __init__(self, max_bytes: int, dimension: int):
+        self.dimension = dimension
+        self.capacity = max(1, max_bytes // (dimension * 4 + ENTRY_OVERHEAD_BYTES))
+
+        # np.empty does not touch the pages; memory is committed as rows fill up
+        self._slab = np.empty((self.capacity, dimension), dtype=np.float32)
+        self._slots: "OrderedDict[bytes, int]" = OrderedDict()
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_many(self, keys: List[bytes], out: np.ndarray) -> List[int]:
+        """
+        Copy cached vectors into the matching rows of out.
+        Returns the positions of keys that were not cached.
+        """
+        positions = []
+        slots = []
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                else:
+                    self._slots.move_to_end(key)
+                    positions.append(i)
+                    slots.append(slot)
+            if slots:
+                out[positions] = self._slab[slots]
+            self._hits += len(slots)
+            self._misses += len(missing)
+        return missing
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """Insert vectors, evicting least recently used entries when full"""
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                slot = self._slots.get(key)
+                if slot is None:
+                    if self._free:
+                        slot = self._free.pop()
+                    else:
+                        _, slot = self._slots.popitem(last=False)
+                        self._evictions += 1
+                    self._slots[key] = slot
+                else:
+                    self._slots.move_to_end(key)
+                self._slab[slot] = vector
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._free = list(range(self.capacity - 1, -1, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "bytes": len(self._slots) * self.dimension * 4,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,57 @@
+"""
+Output Precision
+Server-side conversion of float32 embeddings to compact output types:
+- float32: unchanged (4 bytes/dim)
+- float16: half precision (2 bytes/dim)
+- int8:    per-dimension calibrated scaling to [-128, 127] (1 byte/dim)
+- ubinary: sign bits packed 8 per byte, first dimension in the MSB (1 bit/dim)
+
+int8 uses the same level offset, and ubinary the same bit order, as
+sentence-transformers quantize_embeddings.
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+OUTPUT_DTYPES = ("float32", "float16", "int8", "ubinary")
+
+# Calibrated ranges are widened by this fraction on each side, since the
+# calibration corpus is small compared to the traffic it has to cover
+CALIBRATION_MARGIN = 0.1
+
+
+class Int8Calibration:
+    """Per-dimension [min, max] ranges mapped onto the 256 int8 levels"""
+
+    def __init__(self, embeddings: np.ndarray, margin: float = CALIBRATION_MARGIN):
+        low = embeddings.min(axis=0)
+        high = embeddings.max(axis=0)
+        spread = high - low
+        self.corpus_size = len(embeddings)
+        self.low = (low - margin * spread).astype(np.float32)
+        self.high = (high + margin * spread).astype(np.float32)
+        self.step = np.maximum((self.high - self.low) / 255.0, 1e-12).astype(np.float32)
+
+    def quantize(self, embeddings: np.ndarray) -> np.ndarray:
+        levels = np.rint((embeddings - self.low) / self.step) - 128
+        return np.clip(levels, -128, 127).astype(np.int8)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "corpus_size": self.corpus_size,
+            "min": [round(v, 6) for v in self.low.tolist()],
+            "max": [round(v, 6) for v in self.high.tolist()],
+        }
+
+
+def convert(embeddings: np.ndarray, dtype: str, calibration: Optional[Int8Calibration] = None) -> np.ndarray:
+    """Convert a float32 embedding matrix to the requested output dtype"""
+    if dtype == "float32":
+        return embeddings
+    if dtype == "float16":
+        return embeddings.astype(np.float16)
+    if dtype == "int8":
+        return calibration.quantize(embeddings)
+    if dtype == "ubinary":
+        return np.packbits(embeddings > 0, axis=1)
+    raise ValueError(f"Unknown output dtype '{dtype}' (expected one of: {', '.join(OUTPUT_DTYPES)})")
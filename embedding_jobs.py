@@ -0,0 +1,285 @@
+"""
+Bulk Embedding Jobs
+Asynchronous embedding of uploaded files, checkpointed on local disk.
+
+Layout (one directory per job):
+    <jobs_dir>/<job id>/job.json          status, progress and checkpoint
+    <jobs_dir>/<job id>/input.<format>    uploaded file, as received
+    <jobs_dir>/<job id>/texts.jsonl       parsed texts, one JSON string per line
+    <jobs_dir>/<job id>/ids.jsonl         id manifest, one JSON value per embedding row
+    <jobs_dir>/<job id>/errors.jsonl      input records that could not be used
+    <jobs_dir>/<job id>/embeddings.npy    float32 (rows, dimension), preallocated and filled in place
+
+Records without an id get their input record index in the manifest.
+Progress (rows written, byte offset into texts.jsonl) is checkpointed after
+every chunk, so a job interrupted by a restart continues where it stopped.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from text_sources import iter_file_records
+
+ACTIVE_STATES = ("queued", "preparing", "running")
+
+# How often an idle runner rescans the jobs directory (uploads handled by
+# another worker process are only seen this way)
+POLL_INTERVAL_S = 2.0
+
+DOWNLOAD_FILES = ("embeddings.npy", "ids.jsonl", "errors.jsonl")
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class JobNotFound(KeyError):
+    """No job with this id"""
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def prepare_input(input_path: str, fmt: str, out_dir: str, dimension: int) -> Tuple[int, int]:
+    """
+    Parse an input file into texts.jsonl / ids.jsonl / errors.jsonl in out_dir
+    and preallocate embeddings.npy. Returns (valid rows, rejected records).
+    """
+    total = 0
+    invalid = 0
+    with open(os.path.join(out_dir, "texts.jsonl"), "w", encoding="utf-8") as texts, \
+            open(os.path.join(out_dir, "ids.jsonl"), "w", encoding="utf-8") as ids, \
+            open(os.path.join(out_dir, "errors.jsonl"), "w", encoding="utf-8") as errors:
+        for index, record_id, text, error in iter_file_records(input_path, fmt):
+            if error is not None:
+                errors.write(json.dumps({"index": index, "error": error}) + "\n")
+                invalid += 1
+                continue
+            texts.write(json.dumps(text) + "\n")
+            ids.write(json.dumps(index if record_id is None else record_id) + "\n")
+            total += 1
+
+    matrix = np.lib.format.open_memmap(
+        os.path.join(out_dir, "embeddings.npy"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(total, dimension)
+    )
+    del matrix
+    return total, invalid
+
+
+class JobManager:
+    """
+    Stores uploaded jobs on disk and runs them one at a time in the background.
+
+    encode(texts, normalize) must return a float32 matrix; the service passes a
+    function that runs at bulk priority on the shared inference executor, so
+    interactive requests overtake job chunks. Any process may accept uploads;
+    only the process holding jobs.lock runs them.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: str,
+        encode: Callable[[List[str], bool], Awaitable[np.ndarray]],
+        dimension: int,
+        chunk_size: int = 64
+    ):
+        self.jobs_dir = jobs_dir
+        self.dimension = dimension
+        self.chunk_size = chunk_size
+        self._encode = encode
+        os.makedirs(jobs_dir, exist_ok=True)
+
+        # Single runner across processes
+        self._lock_file = open(os.path.join(jobs_dir, "jobs.lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.runner = True
+        except OSError:
+            self.runner = False
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._current: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the background runner (resumes unfinished jobs first)"""
+        if self.runner:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run_loop())
+
+    async def stop(self):
+        """Stop the runner; the job in progress resumes from its checkpoint next start"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._lock_file.close()
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+    async def create(self, chunks: AsyncIterator[bytes], fmt: str, normalize: bool) -> Dict[str, Any]:
+        """Write an uploaded body to a new job directory and queue the job"""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(path)
+        size = 0
+        try:
+            with open(os.path.join(path, f"input.{fmt}"), "wb") as f:
+                async for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "format": fmt,
+            "normalize": normalize,
+            "dimension": self.dimension,
+            "input_bytes": size,
+            "total": None,
+            "done": 0,
+            "invalid": 0,
+            "error": None,
+            "created": _now(),
+            "started": None,
+            "finished": None,
+            "checkpoint": {"rows": 0, "offset": 0},
+        }
+        self._save(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        """Current state of a job; raises JobNotFound"""
+        if not _JOB_ID.fullmatch(job_id):
+            raise JobNotFound(job_id)
+        try:
+            with open(os.path.join(self.jobs_dir, job_id, "job.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise JobNotFound(job_id)
+
+    def file_path(self, job_id: str, name: str) -> str:
+        """Path of one of a job's result files"""
+        if name not in DOWNLOAD_FILES:
+            raise ValueError(f"Unknown job file '{name}'")
+        self.get(job_id)
+        return os.path.join(self.jobs_dir, job_id, name)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {}
+        for job in self._jobs():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "path": self.jobs_dir,
+            "runner": self.runner,
+            "current": self._current,
+            "jobs": counts,
+        }
+
+    def _jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if _JOB_ID.fullmatch(name):
+                try:
+                    jobs.append(self.get(name))
+                except (JobNotFound, ValueError):
+                    continue  # Upload still in progress, or a torn job.json
+        return jobs
+
+    def _save(self, job: Dict[str, Any]):
+        """Atomically replace job.json"""
+        job["updated"] = _now()
+        path = os.path.join(self.jobs_dir, job["id"], "job.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------
+    # Runner
+    # ------------------------------------------------------------------
+    async def _run_loop(self):
+        while True:
+            pending = [job for job in self._jobs() if job["status"] in ACTIVE_STATES]
+            if not pending:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(min(pending, key=lambda job: job["created"]))
+
+    async def _run(self, job: Dict[str, Any]):
+        self._current = job["id"]
+        try:
+            if job["status"] != "running":
+                # Parsing restarts from scratch; it is cheap next to encoding
+                job.update(status="preparing", started=job["started"] or _now())
+                self._save(job)
+                path = os.path.join(self.jobs_dir, job["id"])
+                total, invalid = await asyncio.to_thread(
+                    prepare_input, os.path.join(path, f"input.{job['format']}"), job["format"], path, self.dimension
+                )
+                job.update(status="running", total=total, invalid=invalid, done=0,
+                           checkpoint={"rows": 0, "offset": 0})
+                self._save(job)
+            await self._encode_rows(job)
+            job.update(status="completed", finished=_now())
+            self._save(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.update(status="failed", error=str(e), finished=_now())
+            self._save(job)
+        finally:
+            self._current = None
+
+    async def _encode_rows(self, job: Dict[str, Any]):
+        """Encode texts.jsonl from the last checkpoint, chunk by chunk"""
+        path = os.path.join(self.jobs_dir, job["id"])
+        total = job["total"]
+        rows = job["checkpoint"]["rows"]
+        if rows >= total:
+            return
+        matrix = np.lib.format.open_memmap(os.path.join(path, "embeddings.npy"), mode="r+")
+        resumed_rows = rows
+        start_time = time.perf_counter()
+        with open(os.path.join(path, "texts.jsonl"), "rb") as texts:
+            texts.seek(job["checkpoint"]["offset"])
+            while rows < total:
+                chunk = [json.loads(texts.readline()) for _ in range(min(self.chunk_size, total - rows))]
+                matrix[rows:rows + len(chunk)] = await self._encode(chunk, job["normalize"])
+                matrix.flush()
+                rows += len(chunk)
+                rate = (rows - resumed_rows) / max(time.perf_counter() - start_time, 1e-9)
+                job.update(
+                    done=rows,
+                    texts_per_second=round(rate, 1),
+                    eta_seconds=round((total - rows) / rate, 1),
+                    checkpoint={"rows": rows, "offset": texts.tell()}
+                )
+                self._save(job)
+        del matrix
@@ -0,0 +1,221 @@
+"""
+Embedding Manifest
+Per-row bookkeeping that makes bulk re-embedding incremental.
+
+An output directory holds, row-aligned:
+    embeddings.npy   float32 (rows, dimension)
+    ids.jsonl        id of each row, one JSON value per line
+    manifest.npy     (text hash, model version) of each row
+
+A row is current when its version equals the version of the model in use;
+version 0 marks a row whose vector has not been written yet. Diffing a new
+input against the manifest gives the rows to embed: new ids, changed texts
+and rows left by another model. Rows of removed ids are reused by new ids,
+or filled with rows moved from the end of the file, so the matrix stays
+dense and is patched in place rather than rewritten.
+"""
+import hashlib
+import io
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_backends import checkpoint_files
+from embedding_store import model_checksum
+
+MANIFEST_RECORD = np.dtype([("hash", "V16"), ("version", "<u8")])
+PENDING = 0
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def model_version(model_id: str, checksum: str) -> int:
+    """Nonzero 64-bit version of the vectors a model produces"""
+    digest = hashlib.sha256(f"{model_id}|{checksum}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") or 1
+
+
+def checkpoint_version(model_path: str, normalize: bool = True) -> int:
+    """
+    model_version of the installed checkpoint: stamps manifests and packed
+    indexes. Backend (torch / ONNX) and quantization are left out, as they
+    reproduce the checkpoint's vectors, and so is where it is installed.
+    A model path that is not a local directory is identified by name.
+    """
+    files = checkpoint_files(model_path)
+    model_id = "checkpoint" if files else model_path
+    return model_version(f"{model_id}|{'normalized' if normalize else 'raw'}", model_checksum(files))
+
+
+class UpdatePlan:
+    """Target layout of an output directory after an incremental update"""
+
+    def __init__(self, rows: int, ids: List[str], manifest: np.ndarray, moves: List[Tuple[int, int]],
+                 pending_rows: np.ndarray, counts: Dict[str, int]):
+        self.rows = rows
+        self.ids = ids                    # JSON-encoded id per row
+        self.manifest = manifest          # MANIFEST_RECORD per row; pending rows have version 0
+        self.moves = moves                # (source row, destination row) vector copies
+        self.pending_rows = pending_rows  # Target row of each line of texts.jsonl
+        self.counts = counts
+
+
+def read_manifest(out_dir: str) -> Tuple[List[str], np.ndarray]:
+    """JSON-encoded ids and manifest of an output directory (empty if new)"""
+    ids_path = os.path.join(out_dir, "ids.jsonl")
+    manifest_path = os.path.join(out_dir, "manifest.npy")
+    if not os.path.exists(manifest_path):
+        return [], np.zeros(0, dtype=MANIFEST_RECORD)
+    with open(ids_path, encoding="utf-8") as f:
+        ids = [line.rstrip("\n") for line in f]
+    manifest = np.load(manifest_path)
+    if len(ids) != len(manifest):
+        raise ValueError(f"{manifest_path} has {len(manifest)} rows but ids.jsonl has {len(ids)}")
+    return ids, manifest
+
+
+def plan_update(
+    records: Iterator[Tuple[int, Optional[Any], Optional[str], Optional[str]]],
+    out_dir: str,
+    version: int
+) -> UpdatePlan:
+    """
+    Diff input records against the manifest in out_dir.
+    Texts to embed are written to texts.jsonl (in input order) and rejected
+    records to errors.jsonl; records without an id are keyed by input index.
+    """
+    old_ids, old_manifest = read_manifest(out_dir)
+    old_rows = len(old_ids)
+    row_of = {key: row for row, key in enumerate(old_ids)}
+    seen = np.zeros(old_rows, dtype=bool)
+
+    changed = {}          # Existing row -> new hash
+    added = []            # (key, hash) of new ids
+    pending_rows = []     # Existing row, or -(k + 1) for the k-th new id
+    keys = set()
+    counts = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0, "invalid": 0}
+
+    with open(os.path.join(out_dir, "texts.jsonl"), "w", encoding="utf-8") as texts, \
+            open(os.path.join(out_dir, "errors.jsonl"), "w", encoding="utf-8") as errors:
+        for index, record_id, text, error in records:
+            key = json.dumps(index if record_id is None else record_id)
+            if error is None and key in keys:
+                error = f"Duplicate id {key}"
+            if error is not None:
+                errors.write(json.dumps({"index": index, "error": error}) + "\n")
+                counts["invalid"] += 1
+                continue
+            keys.add(key)
+
+            digest = text_hash(text)
+            row = row_of.get(key)
+            if row is not None:
+                seen[row] = True
+                entry = old_manifest[row]
+                if entry["hash"].tobytes() == digest and int(entry["version"]) == version:
+                    counts["unchanged"] += 1
+                    continue
+                changed[row] = digest
+                pending_rows.append(row)
+            else:
+                added.append((key, digest))
+                pending_rows.append(-len(added))
+            texts.write(json.dumps(text) + "\n")
+
+    holes = np.flatnonzero(~seen)
+    rows = old_rows - len(holes) + len(added)
+    counts.update(changed=len(changed), added=len(added), removed=len(holes))
+
+    # New ids fill the rows of removed ids first, then extend the matrix
+    added_rows = np.concatenate([
+        holes[:len(added)],
+        np.arange(old_rows, old_rows + max(0, len(added) - len(holes)))
+    ]).astype(np.int64)
+
+    # Remaining holes below the new row count take live rows from the tail
+    leftover = holes[len(added):]
+    destinations = leftover[leftover < rows]
+    sources = np.flatnonzero(seen[rows:]) + rows if rows < old_rows else np.zeros(0, dtype=np.int64)
+    moves = list(zip(sources.tolist(), destinations.tolist()))
+    moved_to = dict(moves)
+
+    ids = old_ids[:rows] + [None] * max(0, rows - old_rows)
+    manifest = np.zeros(rows, dtype=MANIFEST_RECORD)
+    kept = min(rows, old_rows)
+    manifest[:kept] = old_manifest[:kept]
+    for source, destination in moves:
+        ids[destination] = old_ids[source]
+        manifest[destination] = old_manifest[source]
+    for row, digest in changed.items():
+        row = moved_to.get(row, row)
+        manifest[row] = (digest, PENDING)
+    for (key, digest), row in zip(added, added_rows.tolist()):
+        ids[row] = key
+        manifest[row] = (digest, PENDING)
+
+    resolved = [moved_to.get(row, row) if row >= 0 else int(added_rows[-row - 1]) for row in pending_rows]
+    return UpdatePlan(rows, ids, manifest, moves, np.array(resolved, dtype=np.int64), counts)
+
+
+def resize_npy(path: str, rows: int):
+    """Change the row count of a 2-D .npy file in place (new rows are zero)"""
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+        header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order,
+                  "shape": (rows,) + tuple(shape[1:])}
+        buffer = io.BytesIO()
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(buffer, header)
+        else:
+            np.lib.format.write_array_header_2_0(buffer, header)
+        # numpy pads headers so the row count can grow without moving the data
+        if buffer.tell() != offset:
+            raise ValueError(f"Cannot resize {path} in place: header size changed")
+        f.seek(0)
+        f.write(buffer.getvalue())
+        f.truncate(offset + rows * int(np.prod(shape[1:])) * dtype.itemsize)
+
+
+def apply_update(out_dir: str, plan: UpdatePlan, dimension: int):
+    """
+    Reshape embeddings.npy to the plan and commit its ids and manifest.
+    Vectors are moved before the manifest that describes them is replaced;
+    the matrix is only shrunk afterwards.
+    """
+    path = os.path.join(out_dir, "embeddings.npy")
+    if not os.path.exists(path):
+        matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(plan.rows, dimension))
+        del matrix
+        current_rows = plan.rows
+    else:
+        current_rows = np.load(path, mmap_mode="r").shape[0]
+        if plan.rows > current_rows:
+            resize_npy(path, plan.rows)
+
+    if plan.moves:
+        matrix = np.lib.format.open_memmap(path, mode="r+")
+        sources, destinations = zip(*plan.moves)
+        matrix[list(destinations)] = matrix[list(sources)]
+        matrix.flush()
+        del matrix
+
+    ids_tmp = os.path.join(out_dir, "ids.jsonl.tmp")
+    with open(ids_tmp, "w", encoding="utf-8") as f:
+        for key in plan.ids:
+            f.write(key + "\n")
+    manifest_tmp = os.path.join(out_dir, "manifest.tmp.npy")
+    np.save(manifest_tmp, plan.manifest)
+    os.replace(ids_tmp, os.path.join(out_dir, "ids.jsonl"))
+    os.replace(manifest_tmp, os.path.join(out_dir, "manifest.npy"))
+
+    if plan.rows < current_rows:
+        resize_npy(path, plan.rows)
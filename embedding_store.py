@@ -0,0 +1,246 @@
+"""
+Persistent Embedding Store
+Append-only on-disk embedding cache that survives restarts and deploys.
+
+Layout (one directory per model version):
+    <store_dir>/<version>/meta.json     model path, checksum, dimension
+    <store_dir>/<version>/vectors.f32   raw float32 rows, memory-mapped for reads
+    <store_dir>/<version>/index.bin     append-only (16-byte key, uint64 row) records
+
+The version is derived from the model identity and the checksum of the
+model weights, so swapping the model starts a fresh, empty store.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+KEY_BYTES = 16
+INDEX_RECORD = np.dtype([("key", f"V{KEY_BYTES}"), ("row", "<u8")])
+
+# Pending write batches before new vectors are dropped instead of persisted
+WRITE_QUEUE_SIZE = 1024
+
+
+def model_checksum(paths: List[str]) -> str:
+    """sha256 over the given weight files (name and content)"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped, append-only embedding store with an in-memory hash index.
+
+    Reads are served from a read-only memmap of vectors.f32. Writes are queued
+    and appended by a background thread: vector rows first, then the index
+    records that point at them, so a crash never leaves a dangling index entry.
+
+    Only one process may append; other uvicorn workers open it read-only.
+    """
+
+    def __init__(self, store_dir: str, model_id: str, checksum: str, dimension: int):
+        self.dimension = dimension
+        self.version = hashlib.sha256(f"{model_id}|{checksum}".encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(store_dir, self.version)
+        os.makedirs(self.path, exist_ok=True)
+
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w") as f:
+                json.dump({
+                    "model_id": model_id,
+                    "checksum": checksum,
+                    "dimension": dimension,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                }, f, indent=2)
+
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._index_path = os.path.join(self.path, "index.bin")
+        self._row_bytes = dimension * 4
+
+        # Single writer across processes
+        self._lock_file = open(os.path.join(self.path, "writer.lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.read_only = False
+        except OSError:
+            self.read_only = True
+
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._mmap = None
+        self._mapped_rows = 0
+        self._load()
+
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer = None
+        if not self.read_only:
+            self._writer = threading.Thread(target=self._write_loop, name="embedding-store", daemon=True)
+            self._writer.start()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _load(self):
+        """Rebuild the hash index, trimming any torn tail left by a crash"""
+        for path in (self._vectors_path, self._index_path):
+            if not os.path.exists(path):
+                open(path, "ab").close()
+
+        vector_bytes = os.path.getsize(self._vectors_path)
+        rows = vector_bytes // self._row_bytes
+        index_bytes = os.path.getsize(self._index_path)
+        records = index_bytes // INDEX_RECORD.itemsize
+
+        if not self.read_only:
+            if vector_bytes != rows * self._row_bytes:
+                os.truncate(self._vectors_path, rows * self._row_bytes)
+            if index_bytes != records * INDEX_RECORD.itemsize:
+                os.truncate(self._index_path, records * INDEX_RECORD.itemsize)
+
+        if records:
+            index = np.fromfile(self._index_path, dtype=INDEX_RECORD, count=records)
+            index = index[index["row"] < rows]
+            self._index = dict(zip((k.tobytes() for k in index["key"]), index["row"].tolist()))
+        self._index_offset = records * INDEX_RECORD.itemsize
+        self._rows = rows
+        self._remap()
+
+    def _refresh(self):
+        """Read-only stores: pick up records appended by the writer process"""
+        records = (os.path.getsize(self._index_path) - self._index_offset) // INDEX_RECORD.itemsize
+        if records <= 0:
+            return
+        index = np.fromfile(self._index_path, dtype=INDEX_RECORD, count=records, offset=self._index_offset)
+        self._index_offset += records * INDEX_RECORD.itemsize
+        self._index.update(zip((k.tobytes() for k in index["key"]), index["row"].tolist()))
+        self._remap()
+
+    def _remap(self):
+        """Map every complete row currently in vectors.f32"""
+        rows = os.path.getsize(self._vectors_path) // self._row_bytes
+        if rows == self._mapped_rows:
+            return
+        self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+        self._mapped_rows = rows
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def get_many(self, keys: List[bytes], out: np.ndarray) -> List[int]:
+        """
+        Copy stored vectors into the matching rows of out.
+        Returns the positions of keys that are not stored.
+        """
+        positions = []
+        rows = []
+        missing = []
+        with self._lock:
+            if self.read_only:
+                self._refresh()
+            for i, key in enumerate(keys):
+                row = self._index.get(key)
+                if row is None:
+                    missing.append(i)
+                else:
+                    positions.append(i)
+                    rows.append(row)
+            if rows:
+                if max(rows) >= self._mapped_rows:
+                    self._remap()
+                out[positions] = self._mmap[rows]
+            self._hits += len(rows)
+            self._misses += len(missing)
+        return missing
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def put_many_async(self, keys: List[bytes], vectors: np.ndarray):
+        """Queue vectors for the background writer (dropped if the queue is full)"""
+        if self.read_only or not keys:
+            return
+        try:
+            self._queue.put_nowait((list(keys), np.array(vectors, dtype=np.float32)))
+        except queue.Full:
+            with self._lock:
+                self._dropped += len(keys)
+
+    def _write_loop(self):
+        with open(self._vectors_path, "ab") as vectors_file, open(self._index_path, "ab") as index_file:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                keys, vectors = job
+                with self._lock:
+                    fresh = {}
+                    for key, vector in zip(keys, vectors):
+                        if key not in self._index and key not in fresh:
+                            fresh[key] = vector
+                if not fresh:
+                    continue
+
+                first_row = self._rows
+                block = np.stack(list(fresh.values())).astype(np.float32, copy=False)
+                records = np.empty(len(fresh), dtype=INDEX_RECORD)
+                records["key"] = np.frombuffer(b"".join(fresh), dtype=f"V{KEY_BYTES}")
+                records["row"] = np.arange(first_row, first_row + len(fresh), dtype=np.uint64)
+
+                # Vectors before index records: an index entry never points past the data
+                vectors_file.write(block.tobytes())
+                vectors_file.flush()
+                index_file.write(records.tobytes())
+                index_file.flush()
+
+                with self._lock:
+                    for row, key in enumerate(fresh, start=first_row):
+                        self._index[key] = row
+                    self._rows = first_row + len(fresh)
+                    self._writes += len(fresh)
+
+    def close(self):
+        """Flush queued writes and release the writer lock"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self._mmap = None
+        self._lock_file.close()
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "path": self.path,
+                "version": self.version,
+                "read_only": self.read_only,
+                "entries": len(self._index),
+                "bytes": self._rows * self._row_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "writes": self._writes,
+                "pending_writes": self._queue.qsize(),
+                "dropped": self._dropped,
+            }
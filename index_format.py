@@ -0,0 +1,176 @@
+"""
+Index Format
+Versioned on-disk layout of a packed catalog index, opened with np.memmap.
+
+A packed index is a directory:
+    header.json     format version, model version stamp, shape, index type,
+                    and the size and sha256 of every other file; its own
+                    sha256 covers all of that
+    vectors.npy     normalized float32 (rows, dimension)
+    ids.bin         JSON-encoded ids, concatenated
+    id_offsets.npy  int64 (rows + 1,) byte offsets into ids.bin
+    id_hashes.npy   uint64 (rows,) sorted hashes of the encoded ids
+    id_hash_rows.npy int64 (rows,) row of each sorted hash: id -> row lookup
+    <ann type>/     ANN structure (see IvfIndex / PqIndex / BinaryIndex save)
+
+Opening one reads the header, checks its checksum, the file sizes and the
+model version, and maps the arrays: constant time, whatever the catalog
+size, and the pages are shared by every process that maps them. Hashing
+the file contents is optional (verify=True).
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+FORMAT_NAME = "gift-intelligence-index"
+FORMAT_VERSION = 2
+HEADER_FILE = "header.json"
+
+
+class IndexMismatch(ValueError):
+    """The index on disk is corrupt, from another format version, or built with another model"""
+
+
+def is_packed_index(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def header_checksum(header: Dict[str, Any]) -> str:
+    body = {key: value for key, value in header.items() if key != "checksum"}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def id_hash(encoded: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "little")
+
+
+def write_ids(path: str, ids: Iterable[Any]):
+    """ids.bin, id_offsets.npy and the sorted hash lookup for a sequence of JSON-serializable ids"""
+    offsets, hashes = [0], []
+    with open(os.path.join(path, "ids.bin"), "wb") as f:
+        for row_id in ids:
+            encoded = json.dumps(row_id).encode("utf-8")
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+            hashes.append(id_hash(encoded))
+    np.save(os.path.join(path, "id_offsets.npy"), np.array(offsets, dtype=np.int64))
+    hashes = np.array(hashes, dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")
+    np.save(os.path.join(path, "id_hashes.npy"), hashes[order])
+    np.save(os.path.join(path, "id_hash_rows.npy"), order.astype(np.int64))
+
+
+class IdColumn:
+    """Read-only, memory-mapped ids: decoded one at a time on access, found by binary search"""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, "id_offsets.npy"), mmap_mode="r")
+        self.hashes = np.load(os.path.join(path, "id_hashes.npy"), mmap_mode="r")
+        self.hash_rows = np.load(os.path.join(path, "id_hash_rows.npy"), mmap_mode="r")
+        size = os.path.getsize(os.path.join(path, "ids.bin"))
+        # np.memmap cannot map an empty file
+        self.data = np.memmap(os.path.join(path, "ids.bin"), dtype=np.uint8, mode="r") if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> Any:
+        return json.loads(bytes(self.data[self.offsets[row]:self.offsets[row + 1]]))
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def find(self, row_id: Any) -> Optional[int]:
+        """First row holding row_id, or None"""
+        key = np.uint64(id_hash(json.dumps(row_id).encode("utf-8")))
+        position = int(np.searchsorted(self.hashes, key))
+        # Rows sharing the hash are adjacent; a collision is ruled out by decoding
+        while position < len(self.hashes) and self.hashes[position] == key:
+            row = int(self.hash_rows[position])
+            if self[row] == row_id:
+                return row
+            position += 1
+        return None
+
+
+def write_header(path: str, model_version: int, rows: int, dimension: int, index: Dict[str, Any], source: str):
+    """Checksum every file under path and write header.json last"""
+    files = {}
+    for directory, _, names in os.walk(path):
+        for name in sorted(names):
+            full = os.path.join(directory, name)
+            relative = os.path.relpath(full, path)
+            if relative != HEADER_FILE:
+                files[relative] = {"bytes": os.path.getsize(full), "sha256": file_checksum(full)}
+    header = {
+        "format": FORMAT_NAME,
+        "format_version": FORMAT_VERSION,
+        "model_version": f"{model_version:016x}",
+        "rows": rows,
+        "dimension": dimension,
+        "index": index,
+        "source": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "files": files,
+    }
+    header["checksum"] = header_checksum(header)
+    with open(os.path.join(path, HEADER_FILE), "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def read_header(path: str, model_version: Optional[int], verify: bool = False) -> Dict[str, Any]:
+    """
+    header.json of a packed index, after checking it against the files and
+    the model in use (model_version None skips the model check).
+    Raises IndexMismatch.
+    """
+    try:
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+    except (OSError, ValueError) as e:
+        raise IndexMismatch(f"{path}: unreadable header ({e})")
+    if header.get("format") != FORMAT_NAME or header.get("format_version") != FORMAT_VERSION:
+        raise IndexMismatch(
+            f"{path}: format {header.get('format')} v{header.get('format_version')}, "
+            f"expected {FORMAT_NAME} v{FORMAT_VERSION}"
+        )
+    if header.get("checksum") != header_checksum(header):
+        raise IndexMismatch(f"{path}: header checksum mismatch")
+    if model_version is not None and header["model_version"] != f"{model_version:016x}":
+        raise IndexMismatch(
+            f"{path}: built for model version {header['model_version']}, "
+            f"the loaded model is {model_version:016x}"
+        )
+    for name, expected in header["files"].items():
+        full = os.path.join(path, name)
+        if not os.path.isfile(full) or os.path.getsize(full) != expected["bytes"]:
+            raise IndexMismatch(f"{path}: {name} is missing or has the wrong size")
+        if verify and file_checksum(full) != expected["sha256"]:
+            raise IndexMismatch(f"{path}: {name} checksum mismatch")
+    return header
+
+
+def replace_directory(tmp_path: str, path: str):
+    """Swap a fully written tmp_path in for path"""
+    old_path = f"{path}.old"
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
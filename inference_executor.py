@@ -0,0 +1,150 @@
+"""
+Inference Executor
+Runs blocking model calls on dedicated worker threads so the asyncio
+event loop stays free to accept, parse and serialize requests.
+"""
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Job priorities: lower runs first. Bulk jobs only get a thread when no
+# interactive work is waiting.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+_PRIORITY_SHUTDOWN = 1 << 30
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the bounded work queue cannot take another job"""
+
+
+class InferenceExecutor:
+    """
+    Bounded priority work queue drained by a fixed pool of inference threads.
+
+    PyTorch and ONNX Runtime release the GIL inside their kernels, so
+    threads give real parallelism while sharing one copy of the model.
+    Callers get an awaitable future resolved on their own event loop.
+    Jobs of equal priority run in submission order.
+    """
+
+    def __init__(self, num_workers: int = 1, max_queue_size: int = 64, name: str = "inference"):
+        if num_workers < 1:
+            raise ValueError("num_workers must be >= 1")
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.name = name
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=max_queue_size)
+        self._sequence = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        """Spawn the worker threads"""
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"{self.name}-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop workers after the jobs already queued have run"""
+        for _ in self._threads:
+            self._queue.put((_PRIORITY_SHUTDOWN, next(self._sequence), None))
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+    def submit(self, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> "asyncio.Future":
+        """
+        Queue fn(*args, **kwargs) for a worker thread.
+        Must be called from a running event loop; raises InferenceQueueFull
+        instead of blocking when the queue is at capacity.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), (future, loop, fn, args, kwargs)))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise InferenceQueueFull(
+                f"Inference queue is full ({self.max_queue_size} pending jobs)"
+            )
+        return future
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                break
+            future, loop, fn, args, kwargs = job
+
+            # Caller went away (client disconnect / timeout) - skip the work
+            if future.cancelled():
+                continue
+
+            with self._lock:
+                self._busy += 1
+            start_time = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                with self._lock:
+                    self._failed += 1
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            else:
+                with self._lock:
+                    self._completed += 1
+                loop.call_soon_threadsafe(_set_result, future, result)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_seconds += time.perf_counter() - start_time
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth and job counters"""
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "max_queue_size": self.max_queue_size,
+                "queued": self._queue.qsize(),
+                "busy_workers": self._busy,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "busy_seconds": round(self._busy_seconds, 3),
+            }
+
+
+def _set_result(future: "asyncio.Future", result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: "asyncio.Future", exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
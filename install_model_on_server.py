@@ -6,9 +6,14 @@ Run this ONCE on the server to download and cache the model
 from sentence_transformers import SentenceTransformer
 import os
 
+from embedding_backends import OnnxBackend, default_onnx_path, export_onnx, validate_onnx
+from quantization import DEFAULT_MIN_COSINE, agreement_report, quantize_onnx
+
 # Model will be saved in a persistent location on server
 MODEL_CACHE_DIR = "/opt/models/minilm"
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_PATH = default_onnx_path(MODEL_CACHE_DIR)  # Used by EMBEDDING_BACKEND=onnx
+ONNX_MIN_COSINE = 0.9999  # Exported graph must reproduce the PyTorch vectors
 
 print("="*80)
 print("Installing MiniLM Model on Server")
@@ -25,6 +30,28 @@ print("Downloading model from HuggingFace...")
 model = SentenceTransformer(MODEL_NAME)
 model.save(MODEL_CACHE_DIR)
 
+# Export ONNX graph for the ONNX Runtime backend
+print("\nExporting ONNX graph...")
+export_onnx(MODEL_CACHE_DIR, ONNX_PATH)
+min_cosine = validate_onnx(MODEL_CACHE_DIR, ONNX_PATH)
+print(f"✓ ONNX graph written to {ONNX_PATH}")
+print(f"   Min cosine vs PyTorch: {min_cosine:.6f}")
+if min_cosine < ONNX_MIN_COSINE:
+    os.remove(ONNX_PATH)
+    raise SystemExit(
+        f"❌ ONNX validation failed (min cosine {min_cosine:.6f} < {ONNX_MIN_COSINE}). "
+        "Graph removed; the torch backend is unaffected."
+    )
+
+# Pre-quantized INT8 graph for EMBEDDING_QUANTIZE=int8 with the onnx backend
+print("\nQuantizing ONNX graph to INT8...")
+int8_path = quantize_onnx(ONNX_PATH)
+report = agreement_report(OnnxBackend(MODEL_CACHE_DIR, ONNX_PATH), OnnxBackend(MODEL_CACHE_DIR, int8_path))
+print(f"✓ INT8 graph written to {int8_path}")
+print(f"   Cosine vs fp32 - min: {report['min_cosine']:.6f}, mean: {report['mean_cosine']:.6f}")
+if report["min_cosine"] < DEFAULT_MIN_COSINE:
+    print(f"⚠️  Below the service threshold ({DEFAULT_MIN_COSINE}); int8 mode will be refused at startup")
+
 print("\n✅ Model installed successfully!")
 print(f"   Location: {MODEL_CACHE_DIR}")
 print(f"   Size: ~90MB")
@@ -0,0 +1,164 @@
+"""
+IVF Index
+Approximate nearest-neighbour search with an inverted file, in NumPy.
+
+Build: spherical k-means picks n_lists coarse centroids; every vector is
+assigned to its nearest centroid and the vectors are stored grouped by
+list, so each list is one contiguous block of rows.
+
+Search: a query scores the centroids, probes its nprobe best lists and
+ranks only the vectors in them. Queries of one batch that probe the same
+list share a single matmul against that list's block.
+
+Saved as a directory of .npy files (see save / load).
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from similarity import block_rows, top_k_rows
+
+# k-means trains on at most this many vectors per list
+TRAIN_SAMPLES_PER_LIST = 256
+
+
+def default_lists(rows: int) -> int:
+    """About 4 * sqrt(rows) lists, the usual IVF starting point"""
+    return max(1, min(rows, int(4 * np.sqrt(rows))))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, max_block_bytes: int = 64 << 20) -> np.ndarray:
+    """Nearest centroid (by cosine) of every vector"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    step = block_rows(len(centroids), max_block_bytes)
+    for start in range(0, len(vectors), step):
+        labels[start:start + step] = np.argmax(vectors[start:start + step] @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) vectors"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * TRAIN_SAMPLES_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        sums[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        # Empty lists restart from a random sample vector
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IvfIndex:
+    """Inverted-file index over normalized vectors; returns catalog row numbers"""
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, row_ids: np.ndarray, vectors: np.ndarray,
+                 nprobe: int = 8):
+        self.centroids = centroids  # (n_lists, dimension)
+        self.offsets = offsets      # (n_lists + 1,) list l holds stored rows offsets[l]:offsets[l + 1]
+        self.row_ids = row_ids      # Catalog row of each stored row
+        self.vectors = vectors      # Stored rows, grouped by list
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None, nprobe: int = 8,
+              iterations: int = 20, seed: int = 0) -> "IvfIndex":
+        n_lists = n_lists or default_lists(len(vectors))
+        centroids = train_centroids(vectors, n_lists, iterations, seed)
+        labels = assign(vectors, centroids)
+        row_ids = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, offsets, row_ids, np.ascontiguousarray(vectors[row_ids]), nprobe)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ("centroids", "offsets", "row_ids", "vectors"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"rows": len(self), "n_lists": self.n_lists, "nprobe": self.nprobe,
+                       "dimension": self.centroids.shape[1]}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, nprobe: Optional[int] = None, mmap: bool = False) -> "IvfIndex":
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+                  for name in ("centroids", "offsets", "row_ids", "vectors")}
+        return cls(nprobe=nprobe or meta["nprobe"], **arrays)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalog rows and scores of the (approximate) k nearest rows per query.
+        Queries with fewer than k vectors in their probed lists are padded with
+        row -1 and score -inf. exclude: boolean mask of catalog rows that score -inf.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        probes, _ = top_k_rows(queries @ self.centroids.T, nprobe)
+
+        # Group (query, list) probes by list: one matmul per probed list
+        flat_lists = probes.ravel()
+        flat_queries = np.repeat(np.arange(len(queries)), nprobe)
+        order = np.argsort(flat_lists, kind="stable")
+        flat_lists, flat_queries = flat_lists[order], flat_queries[order]
+        bounds = np.flatnonzero(np.diff(flat_lists)) + 1
+
+        pieces: List[List[Tuple[np.ndarray, int, int]]] = [[] for _ in range(len(queries))]
+        for group in np.split(np.arange(len(flat_lists)), bounds):
+            start, end = self.offsets[flat_lists[group[0]]], self.offsets[flat_lists[group[0]] + 1]
+            if start == end:
+                continue
+            members = flat_queries[group]
+            scores = queries[members] @ self.vectors[start:end].T
+            if exclude is not None:
+                scores[:, exclude[self.row_ids[start:end]]] = -np.inf
+            for row, query in enumerate(members):
+                pieces[query].append((scores[row], start, end))
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        top_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for query, parts in enumerate(pieces):
+            if not parts:
+                continue
+            scores = np.concatenate([part[0] for part in parts])
+            positions = np.concatenate([np.arange(part[1], part[2]) for part in parts])
+            best, best_scores = top_k_rows(scores[None, :], k)
+            found = best.shape[1]
+            indices[query, :found] = self.row_ids[positions[best[0]]]
+            top_scores[query, :found] = best_scores[0]
+        return indices, top_scores
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = np.diff(self.offsets)
+        return {
+            "type": "ivf",
+            "n_lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "mean_list_size": round(float(sizes.mean()), 1) if len(sizes) else 0.0,
+            "max_list_size": int(sizes.max()) if len(sizes) else 0,
+        }
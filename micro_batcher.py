@@ -0,0 +1,162 @@
+"""
+Dynamic Micro-Batching
+Gathers items from concurrent requests into one batch call and routes
+each request its slice of the result.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds of the achieved-batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """
+    Cross-request batching scheduler.
+
+    A batch is dispatched as soon as max_batch_size items are pending, or
+    max_wait_ms after the first item arrived. While max_concurrent_batches
+    are already running, new items keep accumulating, so batches grow
+    under load instead of queueing behind each other.
+
+    Requests are never split: one request larger than max_batch_size is
+    dispatched as a batch on its own.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], Awaitable[Sequence]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 1,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_concurrent_batches = max_concurrent_batches
+
+        self._pending: List[Tuple[List[Any], asyncio.Future, float]] = []
+        self._pending_items = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = 0
+        self._tasks = set()
+
+        # Counters
+        self._batches = 0
+        self._requests = 0
+        self._items = 0
+        self._max_batch = 0
+        self._histogram = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self._histogram_overflow = 0
+        self._wait_seconds = 0.0
+
+    async def submit(self, items: List[Any]) -> Sequence:
+        """Queue items and await their slice of the batch result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((items, future, time.perf_counter()))
+        self._pending_items += len(items)
+
+        if self._pending_items >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._on_timer)
+        return await future
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def _on_timer(self):
+        self._timer = None
+        self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending or self._inflight >= self.max_concurrent_batches:
+            # Dispatched when a running batch completes
+            return
+
+        # Take whole requests up to max_batch_size items (always at least one)
+        batch = []
+        size = 0
+        while self._pending:
+            items = self._pending[0][0]
+            if batch and size + len(items) > self.max_batch_size:
+                break
+            batch.append(self._pending.pop(0))
+            size += len(items)
+        self._pending_items -= size
+
+        self._inflight += 1
+        task = asyncio.ensure_future(self._run(batch, size))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        if self._pending:
+            if self._pending_items >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._on_timer)
+
+    async def _run(self, batch: List[Tuple[List[Any], asyncio.Future, float]], size: int):
+        dispatch_time = time.perf_counter()
+        self._record(batch, size, dispatch_time)
+
+        items = [item for request_items, _, _ in batch for item in request_items]
+        try:
+            result = await self.run_batch(items)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            offset = 0
+            for request_items, future, _ in batch:
+                end = offset + len(request_items)
+                if not future.done():
+                    future.set_result(result[offset:end])
+                offset = end
+        finally:
+            self._inflight -= 1
+            # Items that accumulated while this batch ran have already waited
+            if self._pending:
+                self._flush()
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def _record(self, batch, size: int, dispatch_time: float):
+        self._batches += 1
+        self._requests += len(batch)
+        self._items += size
+        self._max_batch = max(self._max_batch, size)
+        self._wait_seconds += sum(dispatch_time - queued_at for _, _, queued_at in batch)
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self._histogram[bound] += 1
+                break
+        else:
+            self._histogram_overflow += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Achieved batch sizes and queueing delay"""
+        histogram = {f"<={bound}": count for bound, count in self._histogram.items()}
+        histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._histogram_overflow
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self._batches,
+            "requests": self._requests,
+            "items": self._items,
+            "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "max_achieved_batch_size": self._max_batch,
+            "mean_requests_per_batch": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "mean_wait_ms": round(self._wait_seconds * 1000 / self._requests, 3) if self._requests else 0.0,
+            "pending_items": self._pending_items,
+            "inflight_batches": self._inflight,
+            "batch_size_histogram": histogram,
+        }
@@ -0,0 +1,179 @@
+"""
+PQ Index
+Product-quantized vector storage and search, in NumPy.
+
+Each vector is split into `subvectors` equal slices; a codebook of up to
+256 centroids is trained per slice with k-means, and a vector is stored as
+one byte (its nearest centroid) per slice: 48 bytes for 384-D with 48
+slices, instead of 1.5KB of float32.
+
+Search is asymmetric (ADC): the query stays exact. Its dot product with
+every centroid of every slice is precomputed into a lookup table, and the
+score of a stored vector is the sum of one table entry per slice. The best
+`rerank` candidates can then be rescored against the full vectors.
+
+Saved as a directory of .npy files (see save / load).
+"""
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from similarity import block_rows, top_k_rows
+
+# Centroids per slice: codes are one uint8 each
+CODEBOOK_SIZE = 256
+# k-means trains on at most this many vectors
+TRAIN_SAMPLES = 64 * CODEBOOK_SIZE
+
+
+def kmeans(points: np.ndarray, clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Euclidean k-means (slices are not unit length)"""
+    centroids = points[rng.choice(len(points), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest(points, centroids)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.stack([np.bincount(labels, points[:, c], clusters) for c in range(points.shape[1])], axis=1)
+        # Empty clusters restart from a random point
+        empty = counts == 0
+        sums[empty] = points[rng.choice(len(points), int(empty.sum()))]
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+    return centroids
+
+
+def nearest(points: np.ndarray, centroids: np.ndarray, max_block_bytes: int = 64 << 20) -> np.ndarray:
+    """Index of the closest centroid (squared L2) of every point"""
+    labels = np.empty(len(points), dtype=np.int64)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    step = block_rows(len(centroids), max_block_bytes)
+    for start in range(0, len(points), step):
+        # argmin |p - c|^2 = argmax p.c - |c|^2 / 2
+        labels[start:start + step] = np.argmax(points[start:start + step] @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+class PqIndex:
+    """Product-quantized vectors with ADC top-k search; returns catalog row numbers"""
+
+    def __init__(self, codebooks: np.ndarray, codes: np.ndarray, rerank: int = 0,
+                 vectors: Optional[np.ndarray] = None, max_block_bytes: int = 64 << 20):
+        self.codebooks = codebooks  # (subvectors, codebook size, slice width) float32
+        self.codes = codes          # (subvectors, rows) uint8, slice-major so each scan step is contiguous
+        self.rerank = rerank        # Candidates rescored with full vectors (0 = ADC scores only)
+        self.vectors = vectors      # Full normalized vectors for reranking (may be a memmap)
+        self.max_block_bytes = max_block_bytes
+
+    @property
+    def subvectors(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.codebooks.shape[0] * self.codebooks.shape[2]
+
+    def __len__(self) -> int:
+        return self.codes.shape[1]
+
+    # ------------------------------------------------------------------
+    # Build / persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, vectors: np.ndarray, subvectors: int = 48, iterations: int = 20, seed: int = 0,
+              **kwargs) -> "PqIndex":
+        rows, dimension = vectors.shape
+        if dimension % subvectors:
+            raise ValueError(f"{dimension}D vectors cannot be split into {subvectors} equal slices")
+        width = dimension // subvectors
+        clusters = min(CODEBOOK_SIZE, rows)
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(rows, min(rows, TRAIN_SAMPLES), replace=False))]
+        codebooks = np.empty((subvectors, clusters, width), dtype=np.float32)
+        codes = np.empty((subvectors, rows), dtype=np.uint8)
+        for s in range(subvectors):
+            columns = slice(s * width, (s + 1) * width)
+            codebooks[s] = kmeans(sample[:, columns], clusters, iterations, rng)
+            codes[s] = nearest(vectors[:, columns], codebooks[s])
+        # The encoded vectors are also the rerank source
+        return cls(codebooks, codes, vectors=vectors, **kwargs)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "codebooks.npy"), self.codebooks)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"rows": len(self), "subvectors": self.subvectors, "dimension": self.dimension,
+                       "codebook_size": self.codebooks.shape[1]}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False, **kwargs) -> "PqIndex":
+        mode = "r" if mmap else None
+        codebooks = np.load(os.path.join(path, "codebooks.npy"))
+        codes = np.load(os.path.join(path, "codes.npy"), mmap_mode=mode)
+        return cls(codebooks, codes, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def lookup_tables(self, queries: np.ndarray) -> np.ndarray:
+        """
+        (subvectors, codebook size, queries) dot products of query slices with
+        centroids; queries last, so one code gathers a contiguous row of scores
+        """
+        slices = queries.reshape(len(queries), self.subvectors, -1)
+        return np.ascontiguousarray(np.einsum("qsw,scw->scq", slices, self.codebooks))
+
+    def adc_scores(self, tables: np.ndarray, start: int, end: int) -> np.ndarray:
+        """(queries, end - start) approximate scores of stored rows start:end"""
+        scores = np.zeros((end - start, tables.shape[2]), dtype=np.float32)
+        for s in range(self.subvectors):
+            scores += tables[s][self.codes[s, start:end]]
+        return scores.T
+
+    def search(self, queries: np.ndarray, k: int, rerank: Optional[int] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Catalog rows and scores of the (approximate) k nearest rows per query.
+        With reranking, the best max(k, rerank) rows by ADC are rescored
+        exactly and the scores returned are exact. exclude: boolean mask of
+        catalog rows that score -inf.
+        """
+        rerank = self.rerank if rerank is None else rerank
+        if self.vectors is None:
+            rerank = 0
+        keep = min(max(k, rerank), len(self))
+        tables = self.lookup_tables(queries)
+
+        # Scan codes block by block, carrying each query's best `keep` rows
+        best = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        step = block_rows(len(queries), self.max_block_bytes)  # Stored rows per (queries, rows) score block
+        for start in range(0, len(self), step):
+            end = min(start + step, len(self))
+            rows = np.broadcast_to(np.arange(start, end), (len(queries), end - start))
+            candidates = np.concatenate([best, rows], axis=1)
+            block = self.adc_scores(tables, start, end)
+            if exclude is not None:
+                block[:, exclude[start:end]] = -np.inf
+            scores = np.concatenate([best_scores, block], axis=1)
+            order, best_scores = top_k_rows(scores, keep)
+            best = np.take_along_axis(candidates, order, axis=1)
+
+        if rerank:
+            exact = np.einsum("qrd,qd->qr", self.vectors[best.ravel()].reshape(*best.shape, -1), queries)
+            if exclude is not None:
+                exact[exclude[best]] = -np.inf
+            order, best_scores = top_k_rows(exact, k)
+            best = np.take_along_axis(best, order, axis=1)
+        return best[:, :k], best_scores[:, :k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "type": "pq",
+            "subvectors": self.subvectors,
+            "bytes_per_vector": self.subvectors,
+            "code_bytes": self.codes.nbytes,
+            "rerank": self.rerank if self.vectors is not None else 0,
+        }
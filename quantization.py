@@ -0,0 +1,141 @@
+"""
+INT8 Quantized Inference
+Dynamic INT8 quantization of the transformer's linear layers, guarded by
+a cosine-agreement check against the fp32 model on a sample corpus.
+
+- torch: torch.ao dynamic quantization applied at load time
+- onnx:  pre-quantized graph written by install_model_on_server.py
+"""
+import copy
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+QUANTIZATION_MODES = ("none", "int8")
+
+# Gift-domain sample corpus used to measure fp32 vs int8 agreement
+SAMPLE_CORPUS = [
+    "Personalized leather wallet for dad",
+    "Scented soy candle gift set with lavender and vanilla",
+    "Birthday present ideas for a coffee lover",
+    "Handmade ceramic mug",
+    "Wireless noise-cancelling headphones for a college student",
+    "Anniversary gift for my wife who loves gardening",
+    "Kids building blocks set, ages 6 and up",
+    "Gourmet chocolate truffle box",
+    "Yoga mat and accessories bundle for beginners",
+    "Vintage vinyl record player with built-in speakers",
+    "Graduation gift for a new nurse",
+    "Custom star map print of the night we met",
+    "Board game for family game night",
+    "Retirement gift for a colleague who enjoys fishing",
+    "Cozy knitted blanket",
+    "Smart watch with fitness tracking and heart rate monitor",
+    "Cookbook of Italian home cooking recipes",
+    "Mother's Day spa gift basket",
+    "Engraved pocket knife for a groomsman",
+    "Housewarming plant in a terracotta pot",
+    "Christmas stocking stuffers under $20",
+    "Gift for someone who has everything",
+    "Leather-bound travel journal for a backpacker heading to South America",
+    "Baby shower gift: organic cotton onesies",
+    "Wine tasting experience for two",
+    "Teacher appreciation gift card",
+    "LEGO architecture set of famous landmarks",
+    "Socks",
+    "Thank you gift for a neighbor who watered our plants all summer",
+    "Premium loose-leaf tea sampler from around the world",
+    "Photography course for a teenager getting their first camera",
+    "Valentine's Day jewelry: sterling silver necklace with birthstone pendant",
+]
+
+# Minimum per-text cosine between fp32 and int8 vectors to enable int8
+DEFAULT_MIN_COSINE = 0.98
+
+
+def int8_onnx_path(onnx_path: str) -> str:
+    """Pre-quantized graph lives next to the fp32 graph"""
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}_int8{ext}"
+
+
+def quantize_onnx(onnx_path: str, output_path: Optional[str] = None) -> str:
+    """Write a dynamically INT8-quantized copy of an exported ONNX graph"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = output_path or int8_onnx_path(onnx_path)
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def quantize_backend(backend):
+    """Return an INT8 variant of a loaded backend (the fp32 one is left untouched)"""
+    if backend.name == "torch":
+        import torch
+
+        quantized = copy.copy(backend)
+        quantized.model = torch.ao.quantization.quantize_dynamic(
+            backend.model,
+            {torch.nn.Linear},
+            dtype=torch.qint8
+        )
+        return quantized
+
+    if backend.name == "onnx":
+        from embedding_backends import OnnxBackend
+
+        path = int8_onnx_path(backend.onnx_path)
+        if not os.path.exists(path):
+            raise RuntimeError(
+                f"Pre-quantized ONNX graph not found at {path}. "
+                "Run install_model_on_server.py to create it."
+            )
+        return OnnxBackend(backend.model_path, path, backend.num_threads)
+
+    raise ValueError(f"INT8 quantization not supported for backend '{backend.name}'")
+
+
+def _normalized(backend, texts: List[str]) -> np.ndarray:
+    embeddings = backend.encode(texts)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+
+def agreement_report(reference, candidate, corpus: List[str] = SAMPLE_CORPUS) -> Dict[str, Any]:
+    """Per-text cosine agreement between two backends on the sample corpus"""
+    cosines = np.sum(_normalized(reference, corpus) * _normalized(candidate, corpus), axis=1)
+    return {
+        "corpus_size": len(corpus),
+        "min_cosine": round(float(cosines.min()), 6),
+        "mean_cosine": round(float(cosines.mean()), 6),
+    }
+
+
+def load_quantized(backend, mode: str, min_cosine: float = DEFAULT_MIN_COSINE):
+    """
+    Apply the requested quantization mode to a loaded fp32 backend.
+
+    Returns (backend_to_serve, report). If the int8 model disagrees with
+    fp32 below min_cosine on any sample text, or cannot be built, the fp32
+    backend is returned and report["enabled"] is False.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Unknown quantization mode '{mode}' (expected one of: {', '.join(QUANTIZATION_MODES)})"
+        )
+    if mode == "none":
+        return backend, {"mode": "none", "enabled": False}
+
+    report: Dict[str, Any] = {"mode": mode, "enabled": False, "threshold": min_cosine}
+    try:
+        quantized = quantize_backend(backend)
+    except Exception as e:
+        report["error"] = str(e)
+        return backend, report
+
+    report.update(agreement_report(backend, quantized))
+    if report["min_cosine"] < min_cosine:
+        return backend, report
+
+    report["enabled"] = True
+    return quantized, report
@@ -0,0 +1,153 @@
+"""
+Response Formats
+Content negotiation and encoders that write embedding matrices straight
+from the numpy buffer.
+
+Binary formats:
+- application/octet-stream: raw little-endian row-major matrix
+- application/x-npy:        the same bytes behind a .npy header (np.load-able)
+Shape and dtype travel in the X-Embedding-Shape / X-Embedding-Dtype headers.
+
+JSON encoding_format="base64": each vector is a base64 string of its
+little-endian bytes.
+
+Fast JSON: with orjson installed, JSON responses are serialized directly
+from numpy rows (no per-float Python objects, no response-model
+revalidation). The wire schema is unchanged. Without orjson, numpy arrays
+in the payload are converted to lists and sent as a plain JSONResponse.
+"""
+import base64
+import io
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # Falls back to jsonable_encoder + JSONResponse
+    orjson = None
+
+FAST_JSON = orjson is not None
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+OCTET_STREAM = "application/octet-stream"
+NPY = "application/x-npy"
+BINARY_MEDIA_TYPES = (OCTET_STREAM, NPY)
+
+# Headers browsers may read on cross-origin responses
+EXPOSED_HEADERS = ["X-Embedding-Shape", "X-Embedding-Dtype", "X-Processing-Time-Ms"]
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response media type from an Accept header.
+    JSON unless a binary type is preferred (by q-value, then order).
+    """
+    if not accept:
+        return JSON
+    best, best_q = JSON, -1.0
+    for part in accept.split(","):
+        fields = [field.strip() for field in part.split(";")]
+        media_type = fields[0].lower()
+        if media_type not in (JSON,) + BINARY_MEDIA_TYPES:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = media_type, q
+    return best if best_q > 0 else JSON
+
+
+def binary_response(
+    matrix: np.ndarray,
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    dtype_label: Optional[str] = None
+) -> Response:
+    """
+    Serialize a 2-D matrix as raw bytes or .npy, without per-element Python objects.
+    dtype_label overrides X-Embedding-Dtype (e.g. "ubinary" for packed uint8 bits).
+    """
+    # Explicit little-endian so the wire format does not depend on the host
+    matrix = np.ascontiguousarray(matrix, dtype=matrix.dtype.newbyteorder("<"))
+    if media_type == NPY:
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, np.lib.format.header_data_from_array_1_0(matrix))
+        content = header.getvalue() + matrix.tobytes()
+    else:
+        content = matrix.tobytes()
+
+    response_headers = {
+        "X-Embedding-Shape": ",".join(str(n) for n in matrix.shape),
+        "X-Embedding-Dtype": dtype_label or matrix.dtype.name,
+    }
+    response_headers.update(headers or {})
+    return Response(content=content, media_type=media_type, headers=response_headers)
+
+
+def base64_rows(matrix: np.ndarray) -> List[str]:
+    """
+    Base64 of each row's little-endian bytes.
+    When a row is a multiple of 3 bytes (384 float32 = 1536 bytes), row
+    boundaries coincide with base64 quanta, so the whole matrix is encoded
+    in one pass and sliced into rows.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=matrix.dtype.newbyteorder("<"))
+    row_bytes = matrix.shape[1] * matrix.itemsize
+    if row_bytes % 3 == 0:
+        encoded = base64.b64encode(matrix.tobytes()).decode("ascii")
+        width = row_bytes // 3 * 4
+        return [encoded[i:i + width] for i in range(0, len(encoded), width)]
+    return [base64.b64encode(row.tobytes()).decode("ascii") for row in matrix]
+
+
+def fast_json_response(payload: Dict[str, Any]) -> Response:
+    """
+    Serialize a payload whose vectors are numpy rows with orjson.
+    Bypasses FastAPI's response_model validation and jsonable_encoder.
+    """
+    return Response(
+        content=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type=JSON
+    )
+
+
+def json_response(payload: Dict[str, Any]) -> Response:
+    """JSON payload that may contain numpy arrays; orjson when available"""
+    if FAST_JSON:
+        return fast_json_response(payload)
+    return JSONResponse(jsonable_encoder(payload, custom_encoder={np.ndarray: np.ndarray.tolist}))
+
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+    """One NDJSON line; numpy arrays are written directly with orjson"""
+    if FAST_JSON:
+        return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    encoded = jsonable_encoder(record, custom_encoder={np.ndarray: np.ndarray.tolist})
+    return (json.dumps(encoded, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class RequestBodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator is still reading the request body.
+
+    Starlette normally runs a disconnect listener that consumes receive()
+    while streaming (ASGI < 2.4), which would swallow request body chunks.
+    Here receive() is left to the body iterator, which sees the disconnect
+    itself when it reads the request stream.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
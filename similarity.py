@@ -0,0 +1,70 @@
+"""
+Similarity Kernels
+Cosine similarity over L2-normalized embedding matrices (a dot product,
+computed with BLAS matmul). Rows of the query matrix are processed in
+blocks sized to a memory budget, so a large comparison never holds more
+than one block of scores besides the requested output.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def block_rows(columns: int, max_block_bytes: int) -> int:
+    """Query rows per block so one float32 score block fits the budget"""
+    return max(1, max_block_bytes // max(1, columns * 4))
+
+
+def similarity_matrix(a: np.ndarray, b: np.ndarray, max_block_bytes: int) -> np.ndarray:
+    """Full (len(a), len(b)) score matrix, filled block by block"""
+    out = np.empty((len(a), len(b)), dtype=np.float32)
+    step = block_rows(len(b), max_block_bytes)
+    for start in range(0, len(a), step):
+        np.matmul(a[start:start + step], b.T, out=out[start:start + step])
+    return out
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column indices and scores of the k best entries of each row, best first.
+    argpartition selects them in linear time; only the k winners are sorted.
+    """
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+def top_k_similarity(
+    a: np.ndarray,
+    b: np.ndarray,
+    k: int,
+    max_block_bytes: int,
+    exclude_self: bool = False,
+    exclude: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k columns of b for every row of a, computed block by block.
+    exclude_self (a is b): a row never matches itself.
+    exclude: boolean mask over the rows of b that score -inf.
+    """
+    k = max(0, min(k, len(b) - (1 if exclude_self else 0)))
+    indices = np.empty((len(a), k), dtype=np.int64)
+    scores = np.empty((len(a), k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    step = block_rows(len(b), max_block_bytes)
+    for start in range(0, len(a), step):
+        block = a[start:start + step] @ b.T
+        if exclude_self:
+            rows = np.arange(len(block))
+            block[rows, rows + start] = -np.inf
+        if exclude is not None:
+            block[:, exclude] = -np.inf
+        indices[start:start + step], scores[start:start + step] = top_k_rows(block, k)
+    return indices, scores
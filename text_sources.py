@@ -0,0 +1,103 @@
+"""
+Text Sources
+Parsing of bulk embedding input, shared by the streaming endpoint and
+bulk jobs. NDJSON records are either a bare JSON string or
+{"text": ..., "id": ...}; CSV files need a header with a "text" column
+and may have an "id" column; plain text files hold one text per line.
+"""
+import csv
+import json
+import os
+from typing import Any, AsyncIterator, Iterator, Optional, Tuple, Union
+
+# Longest accepted input line; guards memory against a body without newlines
+MAX_LINE_BYTES = 1024 * 1024
+
+INPUT_FORMATS = ("jsonl", "csv", "txt")
+FORMAT_EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+
+class InvalidRecord(ValueError):
+    """An input line that is not a usable text record"""
+
+
+def parse_ndjson_record(line: Union[str, bytes]) -> Tuple[Optional[Any], str]:
+    """(id, text) from one NDJSON line; id is None for bare strings"""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise InvalidRecord(f"Invalid JSON: {e.msg}")
+    except UnicodeDecodeError:
+        raise InvalidRecord("Line is not valid UTF-8")
+    if isinstance(record, str):
+        return None, record
+    if isinstance(record, dict) and isinstance(record.get("text"), str):
+        return record.get("id"), record["text"]
+    raise InvalidRecord('Expected a JSON string or an object with a "text" string')
+
+
+def format_for_path(path: str) -> str:
+    """Input format from a file extension (anything else is plain text)"""
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "txt")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """
+    Split an async byte stream into non-empty lines as it arrives.
+    Only the current partial line is buffered.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+        if len(buffer) > max_line_bytes:
+            raise InvalidRecord(f"Input line longer than {max_line_bytes} bytes")
+    buffer = buffer.strip()
+    if buffer:
+        yield buffer
+
+
+def iter_file_records(path: str, fmt: str) -> Iterator[Tuple[int, Optional[Any], Optional[str], Optional[str]]]:
+    """
+    (index, id, text, error) for each record of an input file, in order.
+    Blank lines are skipped; records that cannot be used carry an error
+    instead of a text. Raises InvalidRecord when the file itself is unusable.
+    """
+    if fmt == "jsonl":
+        with open(path, "rb") as f:
+            index = 0
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record_id, text = parse_ndjson_record(line)
+                    yield index, record_id, text, None
+                except InvalidRecord as e:
+                    yield index, None, None, str(e)
+                index += 1
+    elif fmt == "txt":
+        with open(path, encoding="utf-8", errors="replace") as f:
+            index = 0
+            for line in f:
+                text = line.rstrip("\r\n")
+                if text.strip():
+                    yield index, None, text, None
+                    index += 1
+    elif fmt == "csv":
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "text" not in reader.fieldnames:
+                raise InvalidRecord('CSV input needs a header row with a "text" column')
+            for index, row in enumerate(reader):
+                text = row.get("text")
+                if text is None:
+                    yield index, row.get("id"), None, 'Missing "text" value'
+                else:
+                    yield index, row.get("id") or None, text, None
+    else:
+        raise ValueError(f"Unknown input format '{fmt}' (expected one of: {', '.join(INPUT_FORMATS)})")